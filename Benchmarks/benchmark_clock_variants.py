@@ -0,0 +1,70 @@
+import os
+import sys
+import copy
+import json
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from clock_variants import (add_variant_support, add_variants, base_clocks, candidate_variants, dominant_variants,
+                            set_base_clocks)
+from main import InfeasibleError, build_model, get_solver, solve_model
+from model import extract_items
+from pyomo.environ import value
+
+# Every n-th product is made as the only output, with and without somersloops
+PRODUCT_STEP = 15
+OUTPUT_AMOUNT = 10.0
+SOMERSLOOPS = [0, 10]
+
+def load_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def run(data, settings, somersloops, mode):
+    # Build and solve the base model alone (None), with base clocks and hull variants ('hull'), or with
+    # every variant as a column ('all')
+    start = time.perf_counter()
+    m = build_model(data, copy.deepcopy(settings))
+    if mode is not None:
+        add_variant_support(m, somersloops)
+        if mode == 'hull':
+            set_base_clocks(m, data, base_clocks(data, settings))
+            add_variants(m, data, dominant_variants(data, settings, somersloops=somersloops))
+        else:
+            add_variants(m, data, candidate_variants(data, settings, somersloops=somersloops))
+    solve_model(m, get_solver())
+    return time.perf_counter() - start, value(m.objective), len(m.v) if mode is not None else 0
+
+def main():
+    data = load_json(os.path.join(ROOT, 'Data', 'data.json'))
+    default = load_json(os.path.join(ROOT, 'Saves', 'default.json'))
+    _, _, products, _ = extract_items(data)
+
+    scenarios = []
+    for item in sorted(item for item in products if item in data['items'])[::PRODUCT_STEP]:
+        settings = copy.deepcopy(default)
+        settings['outputs'] = {item: OUTPUT_AMOUNT}
+        scenarios.append((data['items'][item]['name'], settings))
+
+    print(f"{'Scenario':<40}{'Sloops':>7}{'Base s':>9}{'Hull s':>9}{'All s':>9}{'Hull cols':>10}{'All cols':>10}  Same")
+    totals = [0.0, 0.0, 0.0]
+    for name, settings in scenarios:
+        for somersloops in SOMERSLOOPS:
+            try:
+                base = run(data, settings, somersloops, None)
+                hull = run(data, settings, somersloops, 'hull')
+                full = run(data, settings, somersloops, 'all')
+            except InfeasibleError:
+                print(f"{name[:39]:<40}{somersloops:>7}  infeasible")
+                continue
+            same = abs(hull[1] - full[1]) <= 1e-6 * max(1, abs(full[1]))
+            print(f"{name[:39]:<40}{somersloops:>7}{base[0]:>9.3f}{hull[0]:>9.3f}{full[0]:>9.3f}{hull[2]:>10}{full[2]:>10}  {same}")
+            totals[0] += base[0]
+            totals[1] += hull[0]
+            totals[2] += full[0]
+    print(f"{'Total':<47}{totals[0]:>9.3f}{totals[1]:>9.3f}{totals[2]:>9.3f}")
+
+if __name__ == '__main__':
+    main()
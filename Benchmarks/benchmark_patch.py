@@ -0,0 +1,68 @@
+import os
+import sys
+import copy
+import json
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import build_model
+from model import extract_items
+from session import PlannerSession
+
+# Models kept in the session and recipes touched by the synthetic patch
+MODELS = 20
+CHANGED_RECIPES = 5
+
+def load_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def make_patch(data, settings):
+    # A small game update: slower recipes, one new alternate and one removed recipe
+    new_data = copy.deepcopy(data)
+    candidates = sorted(key for key in data['recipes'] if key not in settings['recipes_off'])
+    for key in candidates[:CHANGED_RECIPES]:
+        new_data['recipes'][key]['time'] *= 1.1
+    added = copy.deepcopy(data['recipes'][candidates[CHANGED_RECIPES]])
+    added['name'] = 'Alternate: ' + added['name'] + ' (Patched)'
+    added['time'] *= 0.9
+    new_data['recipes']['Recipe_Alternate_Patched_C'] = added
+    del new_data['recipes'][candidates[-1]]
+    return new_data
+
+def main():
+    data = load_json(os.path.join(ROOT, 'Data', 'data.json'))
+    default = load_json(os.path.join(ROOT, 'Saves', 'default.json'))
+    _, _, products, _ = extract_items(data)
+
+    scenarios = []
+    for item in sorted(products)[:MODELS]:
+        settings = copy.deepcopy(default)
+        settings['outputs'] = {item: 10.0}
+        scenarios.append(settings)
+    new_data = make_patch(data, default)
+
+    session = PlannerSession(data)
+    start = time.perf_counter()
+    for settings in scenarios:
+        session.model(settings)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    session.apply_patch(new_data)
+    patch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for settings in scenarios:
+        build_model(new_data, copy.deepcopy(settings))
+    rebuild_time = time.perf_counter() - start
+
+    print(f"Models: {len(scenarios)}, patch: {CHANGED_RECIPES} changed, 1 added, 1 removed recipe")
+    print(f"Initial build: {build_time:.3f} s")
+    print(f"Apply patch:   {patch_time:.3f} s")
+    print(f"Full rebuild:  {rebuild_time:.3f} s ({rebuild_time / patch_time:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import csv
+import copy
+import json
+import re
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import InfeasibleError, build_model, get_solver, solve_model
+from pyomo.environ import value
+
+# Every n-th row of results.csv is used as a scenario
+ROW_STEP = 25
+OUTPUT_AMOUNT = 10.0
+
+def load_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def save_scenarios(data):
+    saves = os.path.join(ROOT, 'Saves')
+    return [(filename, load_json(os.path.join(saves, filename))) for filename in sorted(os.listdir(saves)) if filename.endswith('.json')]
+
+def results_csv_scenarios(data, settings):
+    # Each row produces its item with only the row's recipe enabled for that item
+    item_keys = {item['name']: key for key, item in {**data['items'], **data['resources']}.items()}
+    recipe_keys = {recipe['name']: key for key, recipe in data['recipes'].items()}
+    with open(os.path.join(ROOT, 'results.csv'), 'r') as file:
+        rows = list(csv.DictReader(file))
+
+    scenarios = []
+    for row in rows[::ROW_STEP]:
+        item, recipe = item_keys[row['Item']], recipe_keys[row['Recipe']]
+        scenario = copy.deepcopy(settings)
+        scenario['outputs'] = {item: OUTPUT_AMOUNT}
+        scenario['recipes_off'] = scenario['recipes_off'] + [
+            key for key, recipe_data in data['recipes'].items()
+            if key != recipe and any(p['item'] == item for p in recipe_data['products'])]
+        scenarios.append((f"{row['Item']} / {row['Recipe']}", scenario))
+    return scenarios
+
+def iterations(logfile):
+    # glpsol prints one "<iteration>: obj = ..." line per progress report
+    with open(logfile, 'r') as file:
+        counts = re.findall(r'^\*?\s*(\d+): obj', file.read(), re.MULTILINE)
+    return int(counts[-1]) if counts else None
+
+def run(data, settings, scaling):
+    m = build_model(data, copy.deepcopy(settings))
+    logfile = os.path.join(tempfile.mkdtemp(), 'glpsol.log')
+    start = time.perf_counter()
+    solve_model(m, get_solver(), scaling, logfile=logfile)
+    elapsed = time.perf_counter() - start
+    return elapsed, iterations(logfile), value(m.objective), {key for key, var in m.r.items() if var.value is not None and var.value > 0.001}
+
+def main():
+    data = load_json(os.path.join(ROOT, 'Data', 'data.json'))
+    default = load_json(os.path.join(ROOT, 'Saves', 'default.json'))
+    scenarios = save_scenarios(data) + results_csv_scenarios(data, default)
+
+    print(f"{'Scenario':<55}{'Time':>9}{'Scaled':>9}{'Iters':>8}{'Scaled':>8}  Same")
+    totals = [0.0, 0.0, 0, 0]
+    for name, settings in scenarios:
+        try:
+            plain = run(data, settings, False)
+            scaled = run(data, settings, True)
+        except InfeasibleError:
+            print(f"{name[:54]:<55}  infeasible")
+            continue
+        same = abs(plain[2] - scaled[2]) <= 1e-6 * max(1, abs(plain[2])) and plain[3] == scaled[3]
+        print(f"{name[:54]:<55}{plain[0]:>9.3f}{scaled[0]:>9.3f}{str(plain[1]):>8}{str(scaled[1]):>8}  {same}")
+        totals[0] += plain[0]
+        totals[1] += scaled[0]
+        totals[2] += plain[1] or 0
+        totals[3] += scaled[1] or 0
+    print(f"{'Total':<55}{totals[0]:>9.3f}{totals[1]:>9.3f}{totals[2]:>8}{totals[3]:>8}")
+
+if __name__ == '__main__':
+    main()
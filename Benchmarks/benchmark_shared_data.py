@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import multiprocessing
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Workers are started fresh, as they are on Windows
+CONTEXT = multiprocessing.get_context('spawn')
+
+def load_json(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def rss_kb():
+    # Resident set size of this process, None where /proc is not available
+    try:
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+# Both workers import the same modules so only the data path differs
+
+def json_worker(settings, queue):
+    from main import build_model
+    import shared_data
+    data = load_json(os.path.join(ROOT, 'Data', 'data.json'))
+    build_model(data, settings)
+    queue.put((time.time(), rss_kb()))
+
+def shared_worker(name, settings, queue):
+    from main import build_model
+    from shared_data import build_shared_model
+    build_shared_model(name, settings)
+    queue.put((time.time(), rss_kb()))
+
+def run(workers, target, args):
+    queue = CONTEXT.Queue()
+    start = time.time()
+    processes = [CONTEXT.Process(target=target, args=(*args, queue)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    latency = max(ready for ready, _ in reports) - start
+    rss = [kb for _, kb in reports if kb is not None]
+    return latency, sum(rss) / len(rss) if rss else None
+
+def main():
+    from shared_data import publish_planning_data
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else min(os.cpu_count() or 1, 8)
+    data = load_json(os.path.join(ROOT, 'Data', 'data.json'))
+    settings = load_json(os.path.join(ROOT, 'Saves', 'default.json'))
+
+    shm = publish_planning_data(data)
+    try:
+        print(f"Shared block: {shm.size} bytes")
+        print(f"{'Workers':>8}{'json s':>10}{'shared s':>10}{'json RSS KB':>13}{'shared RSS KB':>15}")
+        for workers in range(1, max_workers + 1):
+            json_latency, json_rss = run(workers, json_worker, (settings,))
+            shared_latency, shared_rss = run(workers, shared_worker, (shm.name, settings))
+            print(f"{workers:>8}{json_latency:>10.2f}{shared_latency:>10.2f}{str(json_rss and round(json_rss)):>13}{str(shared_rss and round(shared_rss)):>15}")
+    finally:
+        shm.close()
+        shm.unlink()
+
+if __name__ == '__main__':
+    main()
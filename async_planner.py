@@ -0,0 +1,264 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import time
+
+from main import name_results, settings_key
+
+# Workers are started fresh, as they are on Windows
+CONTEXT = multiprocessing.get_context('spawn')
+# Latencies kept for the metrics percentiles
+LATENCY_SAMPLES = 1000
+
+class WorkerStopped(RuntimeError):
+    pass
+
+def worker_main(connection, name, initializer):
+    # Own process group, so killing the worker also kills the glpsol it started
+    if hasattr(os, 'setsid'):
+        os.setsid()
+    if initializer is not None:
+        initializer()
+    from shared_data import attach_planning_data, optimize_shared
+    # Models are built from the shared planning block, the game data is never sent to a worker
+    attach_planning_data(name)
+    # Only a ready worker is handed out, killing its process group then also stops it
+    connection.send(('ready', None))
+
+    while True:
+        settings = connection.recv()
+        if settings is None:
+            break
+        try:
+            connection.send(('ok', optimize_shared(name, settings)))
+        except Exception as e:
+            connection.send(('error', e))
+
+class Worker:
+    # One planner process, it builds and solves one model at a time
+
+    def __init__(self, name, initializer):
+        self.connection, child_connection = CONTEXT.Pipe()
+        self.process = CONTEXT.Process(target=worker_main, args=(child_connection, name, initializer), daemon=True)
+        self.process.start()
+        child_connection.close()
+        try:
+            self.connection.recv()
+        except EOFError:
+            self.connection.close()
+            self.process.join()
+            raise WorkerStopped("Planner worker stopped while starting.")
+
+    def call(self, settings):
+        self.connection.send(settings)
+        try:
+            status, result = self.connection.recv()
+        except EOFError:
+            self.connection.close()
+            raise WorkerStopped("Planner worker stopped while solving.")
+        if status == 'error':
+            raise result
+        return result
+
+    def kill(self):
+        # Stop the worker and the solver subprocess it is running, a call waiting on it raises WorkerStopped
+        if self.process.is_alive():
+            if os.name == 'nt':
+                subprocess.run(['taskkill', '/F', '/T', '/PID', str(self.process.pid)], capture_output=True)
+            else:
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except OSError:
+                    # No process group yet, the worker has not called setsid
+                    self.process.kill()
+        self.process.join()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+        self.connection.close()
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class AsyncPlanner:
+    # optimize_production for asyncio code. Builds and solves run in a fixed number of worker processes
+    # attached to one shared planning block, concurrent requests with the same normalized settings share
+    # one solve.
+    #
+    # async with AsyncPlanner(data, workers=4) as planner:
+    #     results = await planner.optimize(settings, timeout=30)
+
+    def __init__(self, data, workers=2, initializer=None):
+        self.data = data
+        self.workers = workers
+        self.initializer = initializer
+        # Threads only wait on worker pipes or start workers
+        self.executor = ThreadPoolExecutor(max_workers=workers + 1)
+        self.idle = None
+        self.shm = None  # Planning block the workers attach to, published in start()
+        self.running = {}  # Running or queued solve task by settings key
+        self.waiters = {}  # Number of requests waiting on each solve task
+        self.replacing = set()  # Tasks killing a worker and starting one in its place
+        self.closing = False
+        self.counts = {'requests': 0, 'coalesced': 0, 'solves': 0, 'failed': 0, 'timeouts': 0, 'cancelled': 0}
+        self.queued = 0
+        self.busy = 0
+        self.wait_times = deque(maxlen=LATENCY_SAMPLES)
+        self.solve_times = deque(maxlen=LATENCY_SAMPLES)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # Every request, also timed out, cancelled and failed ones
+        self.failed_latencies = deque(maxlen=LATENCY_SAMPLES)  # Requests that got no results
+
+    async def start(self):
+        # Imported here so workers import shared_data only after their initializer
+        from shared_data import publish_planning_data
+        loop = asyncio.get_running_loop()
+        self.idle = asyncio.Queue()
+        self.shm = publish_planning_data(self.data)
+        workers = await asyncio.gather(*[loop.run_in_executor(self.executor, Worker, self.shm.name, self.initializer) for _ in range(self.workers)])
+        for worker in workers:
+            self.idle.put_nowait(worker)
+        return self
+
+    async def close(self):
+        self.closing = True
+        tasks = list(self.waiters)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Cancelled solves queue their worker kills while they finish
+        await asyncio.gather(*self.replacing, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        while not self.idle.empty():
+            await loop.run_in_executor(self.executor, self.idle.get_nowait().stop)
+        self.executor.shutdown(wait=True)
+        self.shm.close()
+        self.shm.unlink()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def optimize(self, settings, timeout=None):
+        # Results as optimize_production returns them. Raises TimeoutError after timeout seconds and stops the
+        # solve once no other request waits on it, cancelling the calling task stops it the same way.
+        start = time.perf_counter()
+        key = settings_key(settings)
+        self.counts['requests'] += 1
+        if self.closing:
+            raise RuntimeError("Planner is closed.")
+        if key in self.running:
+            self.counts['coalesced'] += 1
+        else:
+            self.running[key] = asyncio.create_task(self.solve(key, settings))
+        task = self.running[key]
+
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        results = None
+        try:
+            results = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.counts['timeouts'] += 1
+            raise
+        except asyncio.CancelledError:
+            if not task.done():
+                self.counts['cancelled'] += 1
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            self.latencies.append(latency)
+            if results is None:
+                self.failed_latencies.append(latency)
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+                # Nobody waits on the solve any more, later requests start a new one
+                if not task.done():
+                    task.cancel()
+                    if self.running.get(key) is task:
+                        del self.running[key]
+        return results
+
+    async def solve(self, key, settings):
+        loop = asyncio.get_running_loop()
+        try:
+            start = time.perf_counter()
+            self.queued += 1
+            try:
+                worker = await self.idle.get()
+            finally:
+                self.queued -= 1
+            self.wait_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            self.busy += 1
+            try:
+                results = await loop.run_in_executor(self.executor, self.call, worker, settings)
+            except asyncio.CancelledError:
+                # The pipe is mid-request, replace the worker instead of reusing it
+                self.replace_worker(worker)
+                raise
+            except WorkerStopped:
+                self.replace_worker(worker)
+                self.counts['failed'] += 1
+                raise
+            except Exception:
+                self.idle.put_nowait(worker)
+                self.counts['failed'] += 1
+                raise
+            finally:
+                self.busy -= 1
+            self.idle.put_nowait(worker)
+            self.solve_times.append(time.perf_counter() - start)
+            self.counts['solves'] += 1
+            return results
+        finally:
+            if self.running.get(key) is asyncio.current_task():
+                del self.running[key]
+
+    def call(self, worker, settings):
+        # Workers return results keyed by id, names come from the game data here
+        return name_results(self.data, settings, worker.call(settings))
+
+    def replace_worker(self, worker):
+        task = asyncio.create_task(self.restart_worker(worker))
+        self.replacing.add(task)
+        task.add_done_callback(self.replacing.discard)
+
+    async def restart_worker(self, worker):
+        # Killing and starting processes blocks, so both run on the executor
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, worker.kill)
+        if not self.closing:
+            self.idle.put_nowait(await loop.run_in_executor(self.executor, Worker, self.shm.name, self.initializer))
+
+    def metrics(self):
+        # Queue depth is the number of solves waiting for a worker, times are in seconds
+        return {
+            **self.counts,
+            'workers': self.workers,
+            'queue_depth': self.queued,
+            'busy_workers': self.busy,
+            'in_flight': len(self.running),
+            'wait_p50': percentile(self.wait_times, 0.5),
+            'wait_p95': percentile(self.wait_times, 0.95),
+            'solve_p50': percentile(self.solve_times, 0.5),
+            'solve_p95': percentile(self.solve_times, 0.95),
+            'latency_p50': percentile(self.latencies, 0.5),
+            'latency_p95': percentile(self.latencies, 0.95),
+            'latency_max': max(self.latencies, default=None),
+            'failed_latency_p50': percentile(self.failed_latencies, 0.5),
+            'failed_latency_p95': percentile(self.failed_latencies, 0.95)}
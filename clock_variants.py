@@ -0,0 +1,190 @@
+from data_patch import set_row
+from main import build_model, collect_results, flow_maps, get_solver, solve_model
+from model import (data_coefficients, power_terms_expr, rate_expr, recipe_complexity, recipe_rates,
+                   recipe_terms_expr)
+from pyomo.environ import *
+
+# Clock speeds a recipe can run at besides 1.0, which is its base column in m.r
+CLOCK_SPEEDS = [0.25, 0.5, 0.75, 1.5, 2.0, 2.5]
+# Machine power grows with clock ** 1.321928 and with the square of the somersloop boost
+POWER_EXPONENT = 1.321928
+# Somersloop slots per machine, a machine with s somersloops makes 1 + s / slots times its products
+SOMERSLOOP_SLOTS = {
+    'Build_ConstructorMk1_C': 1,
+    'Build_SmelterMk1_C': 1,
+    'Build_AssemblerMk1_C': 2,
+    'Build_FoundryMk1_C': 2,
+    'Build_OilRefinery_C': 2,
+    'Build_Converter_C': 2,
+    'Build_ManufacturerMk1_C': 4,
+    'Build_Blender_C': 4,
+    'Build_HadronCollider_C': 4,
+    'Build_QuantumEncoder_C': 4}
+
+# A variant is (recipe, clock, somersloops per machine). Its variable in m.v is the recipe amount it runs
+# at base rates, so it shares the item rates of m.r and only its costs and products differ. Without
+# somersloops a variant only changes costs, so the base column m.r is run at that clock instead.
+
+def add_variant_support(m, somersloops=0):
+    m.variants = Set(dimen=3, initialize=[])
+    m.v = Var(m.variants, within=NonNegativeReals)
+    m.somersloop_limit = Param(initialize=somersloops, mutable=True)
+    m.variant_rows = {}  # Variant coefficients by row key of m.rows
+    m.clocks = {}  # Clock of the base column by recipe, 1.0 when missing
+
+def variant_column(data, variant, resources):
+    # Coefficients of a variant column in each row body
+    recipe, clock, somersloops = variant
+    recipe_data = data['recipes'][recipe]
+    boost = 1 + somersloops / SOMERSLOOP_SLOTS.get(recipe_data['machine'], 1)
+
+    column = [(('product', item), rate * boost) for item, rate in recipe_rates(recipe_data, 'products') if item not in resources]
+    column += [(('ingredient', item), rate) for item, rate in recipe_rates(recipe_data, 'ingredients')]
+    column += [
+        ('power_use', recipe_data['power_use'] * clock ** (POWER_EXPONENT - 1) * boost ** 2),
+        ('building_use', 1 / clock),
+        ('buildings_scaled', recipe_complexity(recipe_data) / clock)]
+    if somersloops:
+        column.append(('somersloop_use', somersloops / clock))
+    return column
+
+def candidate_variants(data, settings, clock_speeds=CLOCK_SPEEDS, somersloops=0):
+    # Every variant of the recipes that are on, generators gain nothing from a different clock
+    variants = []
+    for recipe, recipe_data in data['recipes'].items():
+        if recipe in settings['recipes_off'] or data['machines'][recipe_data['machine']]['power_produced'] > 0:
+            continue
+        slots = SOMERSLOOP_SLOTS.get(recipe_data['machine'], 0) if somersloops else 0
+        for clock in [1.0] + clock_speeds:
+            for count in range(slots + 1):
+                if clock != 1.0 or count:
+                    variants.append((recipe, clock, count))
+    return variants
+
+def variant_cost(data, variant, settings, resources):
+    # Objective cost of one unit of a variant, the cost rows only feed the weighted objective
+    weights = settings['weights']
+    costs = dict((key, coef) for key, coef in variant_column(data, variant, resources) if not isinstance(key, tuple))
+    cost = costs['power_use'] * weights['Power Use']
+    if not settings['max_item']:
+        cost += costs['building_use'] * weights['Building Use'] + costs['buildings_scaled'] * weights['Buildings Scaled']
+    return cost
+
+def base_clocks(data, settings, clock_speeds=CLOCK_SPEEDS):
+    # Clocks without somersloops only change the costs of a recipe, so the cheapest one dominates the
+    # others and the base column runs at it. Returns the recipes where that is not 1.0.
+    resources = set(data['resources'])
+    costs = {}
+    for variant in candidate_variants(data, settings, clock_speeds):
+        recipe, clock, _ = variant
+        costs.setdefault(recipe, []).append((variant_cost(data, variant, settings, resources), clock))
+
+    clocks = {}
+    for recipe, points in costs.items():
+        cost, clock = min(points)
+        if cost < variant_cost(data, (recipe, 1.0, 0), settings, resources) - 1e-9:
+            clocks[recipe] = clock
+    return clocks
+
+def dominant_variants(data, settings, clock_speeds=CLOCK_SPEEDS, somersloops=0):
+    # Variants of a recipe with the same somersloops have the same item rates, so only the ones on the
+    # lower convex hull of (somersloop use, cost) can be in an optimal plan: the cheapest clock for each
+    # somersloop price. This is a piecewise-linear cost curve per recipe and somersloop count, exact for
+    # the clock speeds offered. Variants without somersloops are left to base_clocks.
+    resources = set(data['resources'])
+    groups = {}
+    for variant in candidate_variants(data, settings, clock_speeds, somersloops):
+        recipe, clock, count = variant
+        if count:
+            groups.setdefault((recipe, count), []).append((count / clock, variant_cost(data, variant, settings, resources), variant))
+
+    variants = []
+    for (recipe, count), points in groups.items():
+        hull = []
+        for point in sorted(points, key=lambda point: (point[0], point[1])):
+            # More somersloops per unit and no cheaper
+            if hull and point[1] >= hull[-1][1]:
+                continue
+            while len(hull) >= 2 and cross(hull[-2], hull[-1], point) <= 0:
+                hull.pop()
+            hull.append(point)
+        variants += [variant for _, _, variant in hull]
+    return variants
+
+def cross(a, b, c):
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+def variant_expr(m, key):
+    return sum(coef * m.v[variant] for variant, coef in m.variant_rows.get(key, []))
+
+def clock_terms(m, terms, scale):
+    # Cost terms of the base columns at their clocks
+    return [(recipe, coef * scale(m.clocks[recipe]) if recipe in m.clocks else coef) for recipe, coef in terms]
+
+def set_rows(m, coefficients, keys):
+    # Rebuild rows from the model's coefficient tables, the base column clocks and the variant columns
+    for key in keys:
+        if key == 'somersloop_use':
+            set_row(m, key, variant_expr(m, key) <= m.somersloop_limit)
+        elif key == 'power_use':
+            terms = clock_terms(m, coefficients['power_use'], lambda clock: clock ** (POWER_EXPONENT - 1))
+            set_row(m, key, power_terms_expr(m, terms, coefficients['resources']) + variant_expr(m, key) == m.power_use)
+        elif key == 'building_use':
+            terms = clock_terms(m, [(recipe, 1) for recipe in coefficients['recipes']], lambda clock: 1 / clock)
+            set_row(m, key, recipe_terms_expr(m, terms) + variant_expr(m, key) == m.building_use)
+        elif key == 'buildings_scaled':
+            terms = clock_terms(m, coefficients['complexity'], lambda clock: 1 / clock)
+            set_row(m, key, recipe_terms_expr(m, terms) + variant_expr(m, key) == m.buildings_scaled)
+        elif key[0] == 'product':
+            set_row(m, key, rate_expr(m, m.n, key[1], coefficients['products'][key[1]]) + variant_expr(m, key) == m.i[key[1]])
+        else:
+            set_row(m, key, rate_expr(m, m.x, key[1], coefficients['ingredients'][key[1]]) + variant_expr(m, key) == m.i[key[1]])
+
+def set_base_clocks(m, data, clocks):
+    # Run base columns at other clocks, only the cost rows change
+    m.clocks.update(clocks)
+    set_rows(m, data_coefficients(data), ['power_use', 'building_use', 'buildings_scaled'])
+
+def add_variants(m, data, variants):
+    # Add variant columns and rebuild only the rows they have coefficients in
+    resources = set(data['resources'])
+    touched = set()
+    for variant in variants:
+        m.variants.add(variant)
+        for key, coef in variant_column(data, variant, resources):
+            m.variant_rows.setdefault(key, []).append((variant, coef))
+            touched.add(key)
+    set_rows(m, data_coefficients(data), touched)
+
+def collect_variant_results(m, data, settings):
+    # Variant amounts are added to their recipe amounts, the flow maps only depend on ingredient rates
+    results = collect_results(m, data, settings)
+    variants = []
+    for recipe, clock in m.clocks.items():
+        var = m.r[recipe]
+        if var.value is not None and var.value > 0.001:
+            variants.append({'recipe': recipe, 'clock': clock, 'somersloops': 0, 'amount': var.value, 'machines': var.value / clock})
+    for variant, var in m.v.items():
+        if var.value is not None and var.value > 0.001:
+            recipe, clock, somersloops = variant
+            variants.append({'recipe': recipe, 'clock': clock, 'somersloops': somersloops, 'amount': var.value, 'machines': var.value / clock})
+            results['recipe_amounts'][recipe] = results['recipe_amounts'].get(recipe, 0) + var.value
+            name = data['recipes'][recipe]['name']
+            results['recipes_used'][name] = results['recipes_used'].get(name, 0) + var.value
+    results['products_map'], results['ingredients_map'] = flow_maps(data, results['recipe_amounts'], results['item_amounts'])
+    results['variants'] = variants
+    results['somersloops_used'] = value(m.rows['somersloop_use'].body) if 'somersloop_use' in m.rows else 0
+    return results
+
+def optimize_variants(data, settings, clock_speeds=CLOCK_SPEEDS, somersloops=0):
+    # Solve with the base recipes at their cheapest clocks plus their dominant somersloop variants,
+    # somersloops is the number available for the whole plan
+    m = build_model(data, settings)
+    add_variant_support(m, somersloops)
+    set_base_clocks(m, data, base_clocks(data, settings, clock_speeds))
+    add_variants(m, data, dominant_variants(data, settings, clock_speeds, somersloops))
+    solve_model(m, get_solver())
+
+    results = collect_variant_results(m, data, settings)
+    results['columns'] = len(m.variants)
+    return results
@@ -0,0 +1,91 @@
+from model import (building_use_expr, data_coefficients, item_use_expr, points_terms_expr, power_terms_expr, rate_expr,
+                   recipe_terms_expr)
+
+def diff_entries(old, new):
+    return {
+        'added': {key: new[key] for key in new.keys() - old.keys()},
+        'removed': {key: old[key] for key in old.keys() - new.keys()},
+        'changed': {key: {'old': old[key], 'new': new[key]} for key in old.keys() & new.keys() if old[key] != new[key]}}
+
+def diff_data(old_data, new_data):
+    # Added, removed and changed entries between two data.json versions
+    return {kind: diff_entries(old_data[kind], new_data[kind]) for kind in ('items', 'resources', 'recipes')}
+
+def is_empty(patch):
+    return not any(entries for diff in patch.values() for entries in diff.values())
+
+def recipe_items(recipe_data):
+    return {p['item'] for p in recipe_data['ingredients'] + recipe_data['products']}
+
+def patched_items(patch):
+    # Items whose rows hold a coefficient of an added, removed or changed recipe
+    recipes = patch['recipes']
+    items = set()
+    for recipe_data in list(recipes['added'].values()) + list(recipes['removed'].values()):
+        items |= recipe_items(recipe_data)
+    for change in recipes['changed'].values():
+        items |= recipe_items(change['old']) | recipe_items(change['new'])
+    return items
+
+def set_row(m, key, expr):
+    # Rebuild a row in place, add it if the model does not have it yet
+    if key in m.rows:
+        m.rows[key].set_value(expr)
+    else:
+        m.rows[key] = m.c.add(expr)
+
+def remove_row(m, key):
+    if key in m.rows:
+        m.rows.pop(key).deactivate()
+
+def patch_model(m, data, patch, settings):
+    # Apply a diff_data patch to a model built by build_model, data is the new game data
+    if patch['resources']['added'] or patch['resources']['removed']:
+        raise ValueError("Added or removed resources need a full rebuild.")
+
+    # Coefficient tables of the new data, built once for every row rebuilt below
+    coefficients = data_coefficients(data)
+    recipes, all_items, products = coefficients['recipes'], coefficients['items'], coefficients['products']
+    # Every live item has an ingredient row, removed ones keep their variables fixed at zero
+    model_items = {item for item in m.i.index_set() if ('ingredient', item) in m.rows}
+
+    # Recipe columns
+    for recipe in patch['recipes']['added']:
+        if recipe in m.r:
+            m.r[recipe].unfix()
+        else:
+            m.r.index_set().add(recipe)
+        if recipe in settings['recipes_off']:
+            m.r[recipe].fix(0)
+    for recipe in patch['recipes']['removed']:
+        m.r[recipe].fix(0)
+
+    # Item rows
+    added_items = all_items - model_items
+    removed_items = model_items - all_items
+    for item in added_items:
+        for var in (m.n, m.x, m.i):
+            if item in var:
+                var[item].unfix()
+            else:
+                var.index_set().add(item)
+        m.n[item].fix(settings['inputs'].get(item, 0))
+    for item in removed_items:
+        remove_row(m, ('product', item))
+        remove_row(m, ('ingredient', item))
+        for var in (m.n, m.x, m.i):
+            var[item].fix(0)
+
+    for item in (patched_items(patch) | added_items) & all_items:
+        if item in products:
+            set_row(m, ('product', item), rate_expr(m, m.n, item, products[item]) == m.i[item])
+        else:
+            remove_row(m, ('product', item))
+        set_row(m, ('ingredient', item), rate_expr(m, m.x, item, coefficients['ingredients'][item]) == m.i[item])
+
+    # Cost rows sum over every recipe or item, they are cheap to rebuild
+    set_row(m, 'power_use', power_terms_expr(m, coefficients['power_use'], coefficients['resources']) == m.power_use)
+    set_row(m, 'item_use', item_use_expr(m, all_items) == m.item_use)
+    set_row(m, 'building_use', building_use_expr(m, recipes) == m.building_use)
+    set_row(m, 'buildings_scaled', recipe_terms_expr(m, coefficients['complexity']) == m.buildings_scaled)
+    set_row(m, 'sink_points', points_terms_expr(m, coefficients['points']) == m.sink_points)
@@ -0,0 +1,110 @@
+from main import build_model, get_solver
+from pyomo.environ import *
+
+# Slacks below this amount count as not relaxed
+TOLERANCE = 1e-6
+
+def item_name(data, item):
+    all_items = {**data['items'], **data['resources']}
+    return all_items[item]['name'] if item in all_items else item
+
+def find_candidates(m, settings):
+    # Constraints the user controls: output fixes, resource limits and input fixes
+    candidates = []
+    if settings['outputs'] != []:
+        candidates += [('output', item, amount) for item, amount in settings['outputs'].items()]
+    candidates += [('resource_limit', resource, limit) for resource, limit in settings['resource_limits'].items()]
+    candidates += [('input', item, amount) for item, amount in settings['inputs'].items() if item in m.n]
+    return candidates
+
+def add_elastic_constraints(m, candidates):
+    # Each candidate becomes value = rhs + slack_up - slack_down
+    keys = range(len(candidates))
+    m.slack_up = Var(keys, within=NonNegativeReals)
+    m.slack_down = Var(keys, within=NonNegativeReals)
+    m.elastic = ConstraintList()
+
+    m.resource_constraints.deactivate()
+    for k, (kind, item, amount) in enumerate(candidates):
+        if kind == 'output':
+            m.x[item].unfix()
+            m.elastic.add(m.x[item] == amount + m.slack_up[k] - m.slack_down[k])
+        elif kind == 'input':
+            m.n[item].unfix()
+            m.elastic.add(m.n[item] == amount + m.slack_up[k] - m.slack_down[k])
+        else:
+            m.slack_down[k].fix(0)
+            m.elastic.add(m.i[item] <= m.resource_limit[item] + m.slack_up[k])
+
+    # Relative violation so a Water limit of 100000 and an output of 10 compare fairly
+    m.objective.deactivate()
+    m.infeasibility = Objective(
+        expr = sum((m.slack_up[k] + m.slack_down[k]) / max(1, abs(amount)) for k, (_, _, amount) in enumerate(candidates)),
+        sense = minimize)
+
+def solve_relaxed(m, solver, candidates, relaxable):
+    # Fix slacks of every enforced candidate, return the relaxed amounts or None if infeasible
+    for k, (kind, _, _) in enumerate(candidates):
+        if k in relaxable:
+            m.slack_up[k].unfix()
+            if kind != 'resource_limit':
+                m.slack_down[k].unfix()
+        else:
+            m.slack_up[k].fix(0)
+            m.slack_down[k].fix(0)
+
+    result = solver.solve(m, load_solutions=False)
+    if result.solver.termination_condition != TerminationCondition.optimal:
+        return None
+    m.solutions.load_from(result)
+
+    return {k: m.slack_up[k].value - m.slack_down[k].value for k in relaxable
+            if abs(m.slack_up[k].value - m.slack_down[k].value) > TOLERANCE * max(1, abs(candidates[k][2]))}
+
+def diagnose_infeasibility(data, settings, iis=False):
+    m = build_model(data, settings)
+    candidates = find_candidates(m, settings)
+    add_elastic_constraints(m, candidates)
+    solver = get_solver()
+    solves = 0
+
+    def relax(relaxable):
+        nonlocal solves
+        solves += 1
+        return solve_relaxed(m, solver, candidates, relaxable)
+
+    # Relax everything once, the relaxed candidates are the first guess
+    relaxed = relax(set(range(len(candidates))))
+    if relaxed is None:
+        raise ValueError("Model is infeasible even with all outputs, inputs and resource limits relaxed.")
+
+    # Enforce relaxed candidates again one at a time, smallest first, keeping only those still needed
+    if relaxed:
+        needed = set(relaxed)
+        for k in sorted(relaxed, key=lambda k: abs(relaxed[k]) / max(1, abs(candidates[k][2]))):
+            if relax(needed - {k}) is not None:
+                needed.remove(k)
+        relaxed = relax(needed)
+
+    # Deletion filter: drop each candidate from the enforced set if the rest is still infeasible
+    conflict = None
+    if iis and relaxed:
+        conflict = set(range(len(candidates)))
+        for k in range(len(candidates)):
+            if relax(set(range(len(candidates))) - conflict | {k}) is None:
+                conflict.remove(k)
+
+    return {
+        'feasible': not relaxed,
+        'relaxed': [{
+            'constraint': candidates[k][0],
+            'item': item_name(data, candidates[k][1]),
+            'value': candidates[k][2],
+            'relaxed_value': candidates[k][2] + amount}
+            for k, amount in sorted(relaxed.items())],
+        'iis': None if conflict is None else [{
+            'constraint': candidates[k][0],
+            'item': item_name(data, candidates[k][1]),
+            'value': candidates[k][2]}
+            for k in sorted(conflict)],
+        'solves': solves}
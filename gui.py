@@ -1,5 +1,7 @@
 import os
 import sys
+import time
+startup_start = time.perf_counter()
 # redirect stdout and stderr because Windows is dumb
 if sys.stdout is None or sys.stderr is None:
     sys.stdout = open(os.devnull, 'w')
@@ -7,7 +9,6 @@ if sys.stdout is None or sys.stderr is None:
 
 import PySimpleGUI as sg
 import json
-from main import optimize_production
 
 # Check if GLPK_PATH environment variable is set
 glpk_path = os.getenv('GLPK_PATH')
@@ -143,19 +144,14 @@ weights_layout = [
     ]
 ]
 
-# Layout for recipes page with two columns
+# Layout for recipes page, one searchable table instead of a checkbox per recipe
 recipes_layout = [
     [sg.Text('Recipes', font=('Helvetica', 16), text_color=sg.LOOK_AND_FEEL_TABLE['Modern']['ACCENT1'])],
-    [
-        sg.Column([
-            [sg.Text('Regular Recipes'), sg.Checkbox('Select All', default=True, key='regular_select_all', enable_events=True)],
-            *[[sg.Checkbox(name, default=True, key=f"recipe_{key}")] for key, name in regular_recipes]
-        ], scrollable=True, vertical_scroll_only=True, size=(250, 300)),
-        sg.Column([
-            [sg.Text('Alternate Recipes'), sg.Checkbox('Select All', default=True, key='alternate_select_all', enable_events=True)],
-            *[[sg.Checkbox(name, default=True, key=f"recipe_{key}")] for key, name in alternate_recipes]
-        ], scrollable=True, vertical_scroll_only=True, size=(250, 300))
-    ]
+    [sg.Text('Search'), sg.InputText(key='recipe_search', enable_events=True, size=(30, 1)),
+     sg.Combo(['All', 'Regular', 'Alternate', 'On', 'Off'], default_value='All', key='recipe_filter', enable_events=True, readonly=True, size=(10, 1))],
+    [sg.Table(values=[], headings=['On', 'Recipe', 'Type'], key='recipe_table', auto_size_columns=False, col_widths=[4, 40, 10],
+              justification='left', num_rows=15, select_mode=sg.TABLE_SELECT_MODE_EXTENDED, enable_click_events=True, expand_x=True, expand_y=True)],
+    [sg.Button('Enable Selected'), sg.Button('Disable Selected'), sg.Button('Enable Shown'), sg.Button('Disable Shown')]
 ]
 
 # Function to create input layout
@@ -187,22 +183,28 @@ output_layout = [
     [sg.Button('Add Output'), sg.Button('Remove Output')]
 ]
 
+# Result tables, click a heading to sort by that column
+def create_result_table(key, headings, col_widths, num_rows=20):
+    return sg.Table(values=[], headings=headings, key=key, auto_size_columns=False, col_widths=col_widths,
+                    justification='left', num_rows=num_rows, enable_click_events=True, expand_x=True, expand_y=True)
+
 # Layout for results
 results_layout = [
     [sg.Text('Results', font=('Helvetica', 16), text_color=sg.LOOK_AND_FEEL_TABLE['Modern']['ACCENT1']), sg.Button('Run Optimization'), sg.Button('Save Settings'), sg.Button('Load Settings'), sg.Button('Reset')],
-    [sg.Multiline(size=(80, 20), key='results_output')]
+    [sg.Multiline(size=(80, 8), key='results_output')],
+    [create_result_table('results_table', ['Section', 'Name', 'Amount', '% of Limit'], [22, 34, 12, 10], 12)]
 ]
 
 # Layout for products
 products_layout = [
     [sg.Text('Products', font=('Helvetica', 16), text_color=sg.LOOK_AND_FEEL_TABLE['Modern']['ACCENT1'])],
-    [sg.Multiline(size=(80, 20), key='products_output')]
+    [create_result_table('products_table', ['Item', 'Item Total', 'Recipe', 'Amount', 'Recipe Count'], [24, 10, 30, 10, 10])]
 ]
 
 # Layout for ingredients
 ingredients_layout = [
     [sg.Text('Ingredients', font=('Helvetica', 16), text_color=sg.LOOK_AND_FEEL_TABLE['Modern']['ACCENT1'])],
-    [sg.Multiline(size=(80, 20), key='ingredients_output')]
+    [create_result_table('ingredients_table', ['Recipe', 'Recipe Count', 'Ingredient', 'Amount'], [34, 10, 24, 10])]
 ]
 
 # Main layout with Tabs
@@ -216,14 +218,68 @@ layout = [
          sg.Tab('Results', results_layout),
          sg.Tab('Products', products_layout),
          sg.Tab('Ingredients', ingredients_layout)]
-    ])]
+    ])],
+    [sg.Text('', key='status', size=(60, 1))]
 ]
 
 window = sg.Window('Satisfactory Optimization Tool - 1.0', layout, finalize=True)
 
-# Update recipe checkboxes based on settings
-for key in recipes:
-    window[f'recipe_{key}'].update(value=key not in settings['recipes_off'])
+# Recipes that are turned off, the recipe table only shows the filtered rows
+recipes_off = set(settings['recipes_off'])
+alternate_keys = {key for key, _ in alternate_recipes}
+
+def recipe_rows(search, recipe_filter, recipes_off):
+    search = search.lower()
+    shown = [
+        key for key, name in regular_recipes + alternate_recipes
+        if search in name.lower()
+        and (recipe_filter != 'Regular' or key not in alternate_keys)
+        and (recipe_filter != 'Alternate' or key in alternate_keys)
+        and (recipe_filter != 'On' or key not in recipes_off)
+        and (recipe_filter != 'Off' or key in recipes_off)]
+    rows = [['' if key in recipes_off else 'X', recipes[key], 'Alternate' if key in alternate_keys else 'Regular'] for key in shown]
+    return shown, rows
+
+def update_recipe_table(values):
+    shown, rows = recipe_rows(values['recipe_search'], values['recipe_filter'], recipes_off)
+    window['recipe_table'].update(values=rows)
+    return shown
+
+shown_recipes = update_recipe_table({'recipe_search': '', 'recipe_filter': 'All'})
+
+# Result tables are filled in growing chunks between events so the first rows show at once. Each step
+# redraws the table with twice the rows, so drawing a table costs at most twice drawing it once.
+RENDER_CHUNK = 100
+result_tables = {key: {'rows': [], 'shown': 0, 'sort': None} for key in ('results_table', 'products_table', 'ingredients_table')}
+render_start = None
+
+def set_table_rows(key, rows):
+    result_tables[key].update(rows=rows, shown=0, sort=None)
+    window[key].update(values=[])
+
+def render_next_chunk():
+    # Returns True while some table still has rows to show
+    pending = False
+    for key, table in result_tables.items():
+        if table['shown'] < len(table['rows']):
+            table['shown'] = min(len(table['rows']), max(RENDER_CHUNK, 2 * table['shown']))
+            window[key].update(values=table['rows'][:table['shown']])
+            pending = pending or table['shown'] < len(table['rows'])
+    return pending
+
+def sort_key(value):
+    # Numbers before text so numeric columns sort by value
+    return (0, value, '') if isinstance(value, (int, float)) else (1, 0, str(value))
+
+def sort_table(key, column):
+    table = result_tables[key]
+    reverse = table['sort'] == (column, False)
+    table['rows'].sort(key=lambda row: sort_key(row[column]), reverse=reverse)
+    table['sort'] = (column, reverse)
+    table['shown'] = 0
+    window[key].update(values=[])
+
+window['status'].update(f"Started in {time.perf_counter() - startup_start:.2f} s")
 
 input_key_suffix = 1
 highest_input_key = 1
@@ -238,24 +294,46 @@ def parse_input(input_str):
         return None
 
 while True:
-    event, values = window.read()
+    rendering = any(table['shown'] < len(table['rows']) for table in result_tables.values())
+    event, values = window.read(timeout=10 if rendering else None)
 
     if event == sg.WINDOW_CLOSED:
         break
 
+    # Show the next rows of the result tables
+    elif event == sg.TIMEOUT_KEY:
+        if not render_next_chunk() and render_start is not None:
+            window['status'].update(f"Results drawn in {time.perf_counter() - render_start:.2f} s")
+            render_start = None
+
+    # Handle table clicks: toggle a recipe from its On column, sort result tables by a heading
+    elif isinstance(event, tuple):
+        key, _, (row, column) = event
+        if key == 'recipe_table' and row is not None and row >= 0 and column == 0:
+            recipe = shown_recipes[row]
+            recipes_off.symmetric_difference_update({recipe})
+            shown_recipes = update_recipe_table(values)
+        elif key in result_tables and row == -1 and column is not None:
+            sort_table(key, column)
+
+    # Handle recipe search and filter
+    elif event in ('recipe_search', 'recipe_filter'):
+        shown_recipes = update_recipe_table(values)
+
+    # Handle recipe enable and disable buttons
+    elif event in ('Enable Selected', 'Disable Selected', 'Enable Shown', 'Disable Shown'):
+        chosen = [shown_recipes[row] for row in values['recipe_table']] if event.endswith('Selected') else shown_recipes
+        if event.startswith('Enable'):
+            recipes_off.difference_update(chosen)
+        else:
+            recipes_off.update(chosen)
+        shown_recipes = update_recipe_table(values)
+
     # Handle info buttons
     elif event.startswith('info_'):
         key = event.split('_')[1]
         sg.popup(key, weight_info.get(key, 'No information available.'))
 
-    # Handle select all recipe checkboxes
-    elif event == 'regular_select_all':
-        for key, _ in regular_recipes:
-            window[f'recipe_{key}'].update(values['regular_select_all'])
-    elif event == 'alternate_select_all':
-        for key, _ in alternate_recipes:
-            window[f'recipe_{key}'].update(values['alternate_select_all'])
-
     # Handle add input button
     elif event == 'Add Input':
         if input_key_suffix < highest_input_key:
@@ -302,7 +380,7 @@ while True:
             settings['resource_limits'] = {key: float(values[f'resource_{key}']) for key in settings['resource_limits']}
             settings['weights'] = {key: float(values[f'weight_{key}']) for key in settings['weights']}
             settings['checkbox_Nuclear Waste'] = values.get('checkbox_Nuclear Waste', False)
-            settings['recipes_off'] = [key for key in recipes if not values[f'recipe_{key}']]
+            settings['recipes_off'] = [key for key in recipes if key in recipes_off]
             settings['inputs'] = {key: float(values[f'input_amount_{i}']) for i in range(input_key_suffix) for key, name in sorted_items if name == values[f'input_item_{i}']}
             settings['outputs'] = {key: float(values[f'output_amount_{i}']) for i in range(output_key_suffix) for key, name in sorted_items if name == values[f'output_item_{i}']}
             settings['max_item'] = next((key for key, name in sorted_items if name == values['output_item_0']), False) if values.get('output_checkbox_0') else False
@@ -329,9 +407,9 @@ while True:
                     window[f'weight_{key}'].update(value)
                 # Load nuclear waste checkbox
                 window['checkbox_Nuclear Waste'].update(value=settings['checkbox_Nuclear Waste'])
-                # Load recipe checkboxes
-                for key in recipes:
-                    window[f'recipe_{key}'].update(key not in settings['recipes_off'])
+                # Load recipes
+                recipes_off = set(settings['recipes_off'])
+                shown_recipes = update_recipe_table(values)
                 # Reset existing input rows
                 for i in range(1, highest_input_key):
                     window[f'input_item_{i}'].update(visible=False)
@@ -386,8 +464,8 @@ while True:
         for key, value in settings['weights'].items():
             window[f'weight_{key}'].update(value)
         window['checkbox_Nuclear Waste'].update(value=settings['checkbox_Nuclear Waste'])
-        for key in recipes:
-            window[f'recipe_{key}'].update(key not in settings['recipes_off'])
+        recipes_off = set(settings['recipes_off'])
+        shown_recipes = update_recipe_table(values)
         # Inputs
         window[f'input_item_{0}'].update('')
         window[f'input_amount_{0}'].update('0')
@@ -410,17 +488,20 @@ while True:
         output_key_suffix = 1
         # Windows
         window['results_output'].update('')
-        window['products_output'].update('')
-        window['ingredients_output'].update('')
+        for key in result_tables:
+            set_table_rows(key, [])
         sg.popup("Settings reset to default values.")
 
     # Handle run optimization button
     elif event == 'Run Optimization':
+        # Pyomo and the solver are imported on the first run so the window opens sooner
+        from main import optimize_production, InfeasibleError
+        from diagnose import diagnose_infeasibility
         try:
             settings['resource_limits'] = {key: float(values[f'resource_{key}']) for key in settings['resource_limits']}
             settings['weights'] = {key: float(values[f'weight_{key}']) for key in settings['weights']}
             settings['checkbox_Nuclear Waste'] = values.get('checkbox_Nuclear Waste', False)
-            settings['recipes_off'] = [key for key in recipes if not values[f'recipe_{key}']]
+            settings['recipes_off'] = [key for key in recipes if key in recipes_off]
             settings['inputs'] = {key: float(values[f'input_amount_{i}']) for i in range(input_key_suffix) for key, name in sorted_items if name == values[f'input_item_{i}']}
             settings['outputs'] = {key: float(values[f'output_amount_{i}']) for i in range(output_key_suffix) for key, name in sorted_items if name == values[f'output_item_{i}']}
             settings['max_item'] = next((key for key, name in sorted_items if name == values['output_item_0']), False) if values.get('output_checkbox_0') else False
@@ -430,59 +511,51 @@ while True:
                     if limit == 0:
                         settings['resource_limits'][key] = 0.00001  # Prevent divide-by-zero error
             results = optimize_production(data, settings)
+            render_start = time.perf_counter()
 
-            # Results tab
+            # Results tab, totals in the summary and every list in the table
             results_output = ''
             if settings['max_item'] == 'Points':
-                results_output += 'Sink Points: {}\n\n'.format(round(results.get('sink_points', 0), 1))
-            if results.get('items_input', {}):
-                results_output = 'Items Given:\n'
-                results_output += '\n'.join(f"{item}: {round(amount, 2)}" for item, amount in sorted(results.get('items_input', {}).items()))
-                results_output += '\n\n'
-            results_output += 'Items Returned:\n'
-            results_output += '\n'.join(f"{item}: {round(amount, 2)}" for item, amount in sorted(results.get('items_output', {}).items()))
+                results_output += 'Sink Points: {}\n'.format(round(results.get('sink_points', 0), 1))
             if results.get('power_produced', 0) > 0.01:
-                results_output += '\n\nNet Power Produced: ' + str(round(results.get('power_produced', 0) - results.get('power_use', 0), 2))
-                results_output += '\nResource*/Power Ratio: ' + str(round(results.get('resources_scaled', 0)/(results.get('power_produced', 0) - results.get('power_use', 0)), 2))
-            results_output += '\n\nResources:\n'
-            r_limits = {data['resources'][r]['name']: lim for r, lim in settings['resource_limits'].items()}
-            results_output += '\n'.join(f"{resource}: {round(amount, 2)} ({round(amount/r_limits[resource]*100,1)}%)" for resource, amount in sorted(results.get('resources_needed', {}).items()))
-            results_output += '\n\nRecipes:\n'
-            results_output += '\n'.join(f"{recipe} [{round(amount, 2)}]" for recipe, amount in sorted(results.get('recipes_used', {}).items()))
-            results_output += '\n\n'
-            results_output += 'Items In Production Chain:\n'
-            results_output += '\n'.join(f"{item}: {round(amount, 2)}" for item, amount in sorted(results.get('items_needed', {}).items()))
-            results_output += '\n\n'
-            # --------- For Tests --------
-            #results_output += 'Items Not Needed:\n'
-            #results_output += '\n'.join(f"{item}: {round(amount, 2)}" for item, amount in sorted(results.get('items_not_needed', {}).items()))
-            #results_output += '\n\n'
-            # --------- For Tests --------
+                results_output += 'Net Power Produced: ' + str(round(results.get('power_produced', 0) - results.get('power_use', 0), 2))
+                results_output += '\nResource*/Power Ratio: ' + str(round(results.get('resources_scaled', 0)/(results.get('power_produced', 0) - results.get('power_use', 0)), 2)) + '\n'
             results_output += 'Power Used: {}\n'.format(round(results.get('power_use', 0), 1))
             results_output += 'Items: {}\n'.format(round(results.get('item_use', 0), 1))
             results_output += 'Buildings: {}\n'.format(round(results.get('buildings', 0), 1))
             results_output += 'Resources: {}\n'.format(round(results.get('resources', 0), 1))
             results_output += 'Buildings*: {}\n'.format(round(results.get('buildings_scaled', 0), 1))
-            results_output += 'Resources*: {}\n'.format(round(results.get('resources_scaled', 0), 1))
+            results_output += 'Resources*: {}'.format(round(results.get('resources_scaled', 0), 1))
             window['results_output'].update(results_output)
 
+            r_limits = {data['resources'][r]['name']: lim for r, lim in settings['resource_limits'].items()}
+            rows = [['Given', item, round(amount, 2), ''] for item, amount in sorted(results.get('items_input', {}).items())]
+            rows += [['Returned', item, round(amount, 2), ''] for item, amount in sorted(results.get('items_output', {}).items())]
+            # The share of the limit is a number so the column sorts by value
+            rows += [['Resource', resource, round(amount, 2), round(amount/r_limits[resource]*100, 1)] for resource, amount in sorted(results.get('resources_needed', {}).items())]
+            rows += [['Recipe', recipe, round(amount, 2), ''] for recipe, amount in sorted(results.get('recipes_used', {}).items())]
+            rows += [['Item', item, round(amount, 2), ''] for item, amount in sorted(results.get('items_needed', {}).items())]
+            set_table_rows('results_table', rows)
+
             # Products tab
             all_items = {**results['items_needed'], **results['resources_needed']}
-            results_output = ['Products Map:']
-            for ingredient, map in sorted(results['products_map'].items()):
-                results_output.append(f"\n\n{ingredient} ({round(all_items[ingredient], 2)})")
-                for recipe, num in sorted(map.items()):
-                    results_output.append(f"\n{round(num, 2)} -> {recipe} [{round(results['recipes_used'][recipe], 2)}]")
-            window['products_output'].update(''.join(results_output))
+            rows = [[ingredient, round(all_items[ingredient], 2), recipe, round(num, 2), round(results['recipes_used'][recipe], 2)]
+                    for ingredient, map in sorted(results['products_map'].items()) for recipe, num in sorted(map.items())]
+            set_table_rows('products_table', rows)
 
             # Ingredients tab
-            results_output = ['Ingredients Map:']
-            for recipe, map in sorted(results['ingredients_map'].items()):
-                results_output.append(f"\n\n{recipe} [{round(results['recipes_used'][recipe], 2)}]")
-                for ingredient, num in sorted(map.items()):
-                    results_output.append(f"\n<- {round(num, 2)}  {ingredient}")
-            window['ingredients_output'].update(''.join(results_output))
-
+            rows = [[recipe, round(results['recipes_used'][recipe], 2), ingredient, round(num, 2)]
+                    for recipe, map in sorted(results['ingredients_map'].items()) for ingredient, num in sorted(map.items())]
+            set_table_rows('ingredients_table', rows)
+
+        except InfeasibleError as e:
+            # Find the smallest changes to outputs, inputs and limits that make the plan feasible
+            try:
+                diagnosis = diagnose_infeasibility(data, settings)
+                changes = [f"{c['constraint'].replace('_', ' ').title()} {c['item']}: {round(c['value'], 2)} -> {round(c['relaxed_value'], 2)}" for c in diagnosis['relaxed']]
+                sg.popup_error(f"Error running optimization: {e}", "Smallest changes that make these settings feasible:", *changes)
+            except Exception as e:
+                sg.popup_error(f"Error running optimization: {e}")
         except Exception as e:
             sg.popup_error(f"Error running optimization: {e}")
 
@@ -1,8 +1,23 @@
 from model import create_model
+from scaling import scale_model, unscale_solution
+import json
 import os
 from pyomo.environ import *
 
-def optimize_production(data, settings):
+class InfeasibleError(ValueError):
+    pass
+
+def get_solver():
+    return SolverFactory('glpk', executable=os.path.join(os.getenv('GLPK_PATH'), 'glpsol.exe'))
+
+def settings_key(settings):
+    # Equivalent settings give the same key: max_item is not an output and recipe order does not matter
+    normalized = dict(settings, recipes_off=sorted(settings['recipes_off']))
+    if settings['outputs'] != []:
+        normalized['outputs'] = {item: amount for item, amount in settings['outputs'].items() if item != settings['max_item']}
+    return json.dumps(normalized, sort_keys=True)
+
+def build_model(data, settings):
     # Remove max_item from outputs if exists
     if settings['max_item'] in settings['outputs']:
         del settings['outputs'][settings['max_item']]
@@ -14,60 +29,93 @@ def optimize_production(data, settings):
     for recipe in settings['recipes_off']:
         m.r[recipe].fix(0)
 
+    return m
+
+def solve_model(m, solver, scaling=False, **kwargs):
+    # Optionally solve m row/column scaled in place, it is restored with the solution in original units
+    scaled = scale_model(m) if scaling else None
+    try:
+        result = solver.solve(m, load_solutions=False, **kwargs)
+        if result.solver.termination_condition != TerminationCondition.optimal:
+            raise InfeasibleError(f"No optimal solution found ({result.solver.termination_condition}).")
+        m.solutions.load_from(result)
+    finally:
+        if scaling:
+            unscale_solution(m, scaled)
+    return result
+
+def optimize_production(data, settings, scaling=False):
+    m = build_model(data, settings)
+
     # Solve the model
-    solver = SolverFactory('glpk', executable=os.path.join(os.getenv('GLPK_PATH'), 'glpsol.exe'))
-    result = solver.solve(m)
-    
-    # Collect results
-    sink_points = m.sink_points()
-    items_input = {data['items'][var_name]['name']: var.value for var_name, var in m.n.items() if var.value is not None and var.value > 0.001}
-    items_output = {data['items'][var_name]['name']: var.value for var_name, var in m.x.items() if var.value is not None and var.value > 0.001}
-    resources_needed = {data['resources'][var_name]['name']: var.value for var_name, var in m.i.items() if var.value is not None and var.value > 0.001 and var_name in settings['resource_limits']}
-    items_needed = {data['items'][var_name]['name']: var.value for var_name, var in m.i.items() if var.value is not None and var.value > 0.001 and var_name not in settings['resource_limits']}
-    items_not_needed = {var_name: var.value for var_name, var in m.i.items() if var.value is not None and var.value <= 0.001 and var_name not in settings['resource_limits']}
-    recipes_used = {data['recipes'][var_name]['name']: var.value for var_name, var in m.r.items() if var.value is not None and var.value > 0.001}
-    power_produced = m.x['Power_Produced_Other']() + m.x['Power_Produced_Fuel']() + m.x['Power_Produced_Nuclear']()
+    solver = get_solver()
+    solve_model(m, solver, scaling)
 
+    return collect_results(m, data, settings)
+
+def flow_maps(data, recipe_amounts, item_amounts):
     products_map = {
     data['items'][item]['name'] if item in data['items'] else data['resources'][item]['name']: {
-        data['recipes'][recipe]['name']: (60 / data['recipes'][recipe]['time']) * ingredient['amount'] * recipe_val.value
-        for recipe, recipe_val in m.r.items()
-        if recipe_val.value is not None and recipe_val.value > 0.001
+        data['recipes'][recipe]['name']: (60 / data['recipes'][recipe]['time']) * ingredient['amount'] * amount
+        for recipe, amount in recipe_amounts.items()
         for ingredient in data['recipes'][recipe]['ingredients']
         if item == ingredient['item']}
-    for item, item_val in m.i.items()
-    if item_val.value is not None and item_val.value > 0.001}
+    for item in item_amounts}
 
     all_items = {**data['items'], **data['resources']}
     ingredients_map = {
     data['recipes'][recipe]['name']: {
-        all_items[ingredient['item']]['name']: (60 / data['recipes'][recipe]['time']) * ingredient['amount'] * recipe_val.value
+        all_items[ingredient['item']]['name']: (60 / data['recipes'][recipe]['time']) * ingredient['amount'] * amount
         for ingredient in data['recipes'][recipe]['ingredients']}
-    for recipe, recipe_val in m.r.items()
-    if recipe_val.value is not None and recipe_val.value > 0.001}
+    for recipe, amount in recipe_amounts.items()}
+
+    return products_map, ingredients_map
+
+def collect_sparse_results(m):
+    # Costs and the nonzero solution keyed by recipe and item, no game data needed
+    return {
+        'sink_points': m.sink_points(),
+        'power_produced': m.x['Power_Produced_Other']() + m.x['Power_Produced_Fuel']() + m.x['Power_Produced_Nuclear'](),
+        'power_use': m.power_use(),
+        'item_use': m.item_use(),
+        'buildings': m.building_use(),
+        'resources': m.resource_use(),
+        'buildings_scaled': m.buildings_scaled(),
+        'resources_scaled': m.resources_scaled(),
+        'recipe_amounts': {var_name: var.value for var_name, var in m.r.items() if var.value is not None and var.value > 0.001},
+        'item_amounts': {var_name: var.value for var_name, var in m.i.items() if var.value is not None and var.value > 0.001}}
+
+def collect_plan(m, settings):
+    # Everything collect_results reports, still keyed by id so no game data is needed
+    results = collect_sparse_results(m)
+    results['input_amounts'] = {var_name: var.value for var_name, var in m.n.items() if var.value is not None and var.value > 0.001}
+    results['output_amounts'] = {var_name: var.value for var_name, var in m.x.items() if var.value is not None and var.value > 0.001}
+    results['items_not_needed'] = {var_name: var.value for var_name, var in m.i.items() if var.value is not None and var.value <= 0.001 and var_name not in settings['resource_limits']}
+    return results
 
-    # Extract costs
-    power_use = m.power_use()
-    item_use = m.item_use()
-    buildings = m.building_use()
-    resources = m.resource_use()
-    buildings_scaled = m.buildings_scaled()
-    resources_scaled = m.resources_scaled()
+def name_results(data, settings, plan):
+    # Results of collect_results from a collect_plan result, with names from the game data
+    results = dict(plan)
+    input_amounts = results.pop('input_amounts')
+    output_amounts = results.pop('output_amounts')
+    items_not_needed = results.pop('items_not_needed')
+    items_input = {data['items'][var_name]['name']: amount for var_name, amount in input_amounts.items()}
+    items_output = {data['items'][var_name]['name']: amount for var_name, amount in output_amounts.items()}
+    resources_needed = {data['resources'][var_name]['name']: amount for var_name, amount in results['item_amounts'].items() if var_name in settings['resource_limits']}
+    items_needed = {data['items'][var_name]['name']: amount for var_name, amount in results['item_amounts'].items() if var_name not in settings['resource_limits']}
+    recipes_used = {data['recipes'][var_name]['name']: amount for var_name, amount in results['recipe_amounts'].items()}
+    products_map, ingredients_map = flow_maps(data, results['recipe_amounts'], results['item_amounts'])
 
     return {
-        'sink_points': sink_points,
+        **results,
         'items_input': items_input,
         'items_output': items_output,
         'resources_needed': resources_needed,
         'items_needed': items_needed,
         'items_not_needed': items_not_needed,
         'recipes_used': recipes_used,
-        'power_produced': power_produced,
-        'power_use': power_use,
-        'item_use': item_use,
-        'buildings': buildings,
-        'resources': resources,
-        'buildings_scaled': buildings_scaled,
-        'resources_scaled': resources_scaled,
         'products_map': products_map,
-        'ingredients_map': ingredients_map}
\ No newline at end of file
+        'ingredients_map': ingredients_map}
+
+def collect_results(m, data, settings):
+    return name_results(data, settings, collect_plan(m, settings))
\ No newline at end of file
@@ -1,6 +1,11 @@
 from pyomo.environ import *
 import math
 
+# Power used per unit of resource extracted
+RESOURCE_POWER = 0.168
+# Buildings Scaled cost of a machine is (#inputs + #outputs - 1) ** COMPLEXITY_EXPONENT / 3
+COMPLEXITY_EXPONENT = 1.584963
+
 def extract_items(data):
     resources = set(data['resources'].keys())
     recipes = set(data['recipes'].keys())
@@ -44,64 +49,111 @@ def fix_output_amounts(m, settings):
         else:
             raise KeyError(f"Output item '{item}' not found in model items.")
 
-def add_product_constraints(m, products, data):
-    for item in products:
-        expr = m.n[item] + sum(
-            p['amount'] * 60 / recipe_data['time'] * m.r[recipe_key]
-            for recipe_key, recipe_data in data['recipes'].items()
-            for p in recipe_data['products']
-            if p['item'] == item)
-        if item in m.i:
-            m.c.add(expr == m.i[item])
-        else:
-            raise KeyError(f"Item '{item}' not found in model intermediate items.")
+# Coefficients, shared by the models built from data.json and from the planning arrays of shared_data.py
+
+def recipe_rates(recipe_data, field):
+    # Rate per minute of each item in the recipe's products or ingredients
+    return [(p['item'], p['amount'] * 60 / recipe_data['time']) for p in recipe_data[field]]
+
+def recipe_complexity(recipe_data):
+    return (len(recipe_data['ingredients']) + len(recipe_data['products']) - 1) ** COMPLEXITY_EXPONENT / 3
+
+def item_points(data, item):
+    # Only solid items can be sunk
+    item_data = data['items'].get(item)
+    if item_data is not None and item_data['points'] > 0 and item_data['form'] == 'RF_SOLID':
+        return item_data['points']
+    return 0
 
-def add_ingredient_constraints(m, ingredients, data):
-    for item in ingredients:
-        expr = m.x[item] + sum(
-            p['amount'] * 60 / recipe_data['time'] * m.r[recipe_key]
+def rate_terms(data, item, field):
+    return [(recipe_key, rate)
             for recipe_key, recipe_data in data['recipes'].items()
-            for p in recipe_data['ingredients']
-            if p['item'] == item)
-        if item in m.i:
-            m.c.add(expr == m.i[item])
-        else:
-            raise KeyError(f"Item '{item}' not found in model intermediate items.")
+            for rate_item, rate in recipe_rates(recipe_data, field)
+            if rate_item == item]
+
+# Row bodies from (recipe or item, coefficient) terms
+
+def rate_expr(m, var, item, terms):
+    return var[item] + sum(rate * m.r[recipe_key] for recipe_key, rate in terms)
+
+def recipe_terms_expr(m, terms):
+    return sum(coef * m.r[recipe_key] for recipe_key, coef in terms)
+
+def power_terms_expr(m, terms, resources):
+    return recipe_terms_expr(m, terms) + sum(m.i[item] * RESOURCE_POWER for item in m.i if item in resources)
+
+def points_terms_expr(m, terms):
+    return sum(points * m.x[item] for item, points in terms if points > 0)
+
+def product_expr(m, item, data):
+    return rate_expr(m, m.n, item, rate_terms(data, item, 'products'))
+
+def ingredient_expr(m, item, data):
+    return rate_expr(m, m.x, item, rate_terms(data, item, 'ingredients'))
+
+def add_product_constraints(m, product_terms):
+    for item, terms in product_terms.items():
+        m.rows[('product', item)] = m.c.add(rate_expr(m, m.n, item, terms) == m.i[item])
+
+def add_ingredient_constraints(m, ingredient_terms):
+    for item, terms in ingredient_terms.items():
+        m.rows[('ingredient', item)] = m.c.add(rate_expr(m, m.x, item, terms) == m.i[item])
 
 def add_resource_constraints(m, settings):
-    for resource, limit in settings['resource_limits'].items():
-        if resource in m.i:
-            m.c.add(m.i[resource] <= limit)
-        else:
+    for resource in settings['resource_limits']:
+        if resource not in m.i:
             raise KeyError(f"Resource '{resource}' not found in model items.")
 
-def calculate_power_use(m, data, recipes):
-    expr = sum(data['recipes'][recipe_key]['power_use'] * m.r[recipe_key] for recipe_key in recipes) + sum(m.i[item] * 0.168 for item in m.i if item in data['resources'])
-    m.c.add(expr == m.power_use)
+    # Limits are mutable so the same model can be re-solved with new limits
+    resources = list(settings['resource_limits'])
+    m.resource_limit = Param(resources, initialize=settings['resource_limits'], mutable=True)
+    m.resource_constraints = Constraint(resources, rule=lambda m, resource: m.i[resource] <= m.resource_limit[resource])
+
+def power_use_expr(m, data, recipes):
+    return power_terms_expr(m, [(recipe_key, data['recipes'][recipe_key]['power_use']) for recipe_key in recipes], data['resources'])
+
+def item_use_expr(m, items):
+    return sum(m.i[item] for item in items if item != 'Power_Produced' and item != 'Power_Produced_Other' and item != 'Power_Produced_Fuel' and item != 'Power_Produced_Nuclear')
+
+def building_use_expr(m, recipes):
+    return sum(m.r[recipe_key] for recipe_key in recipes)
+
+def buildings_scaled_expr(m, data, recipes):
+    return recipe_terms_expr(m, [(recipe_key, recipe_complexity(data['recipes'][recipe_key])) for recipe_key in recipes])
+
+def resources_scaled_expr(m, resource_weights):
+    return sum(resource_weights[resource] * m.i[resource] for resource in resource_weights if resource in m.i)
+
+def sink_points_expr(m, data, items):
+    return points_terms_expr(m, [(item, item_points(data, item)) for item in items])
+
+def calculate_power_use(m, power_terms, resources):
+    expr = power_terms_expr(m, power_terms, resources)
+    m.rows['power_use'] = m.c.add(expr == m.power_use)
 
 def calculate_item_use(m, items):
-    expr = sum(m.i[item] for item in items if item != 'Power_Produced' and item != 'Power_Produced_Other' and item != 'Power_Produced_Fuel' and item != 'Power_Produced_Nuclear')
-    m.c.add(expr == m.item_use)
+    expr = item_use_expr(m, items)
+    m.rows['item_use'] = m.c.add(expr == m.item_use)
 
 def calculate_building_use(m, recipes):
-    expr = sum(m.r[recipe_key] for recipe_key in recipes)
-    m.c.add(expr == m.building_use)
+    expr = building_use_expr(m, recipes)
+    m.rows['building_use'] = m.c.add(expr == m.building_use)
 
 def calculate_resource_use(m, settings):
     expr = sum(m.i[item] for item in settings['resource_limits'])
     m.c.add(expr == m.resource_use)
 
-def calculate_buildings_scaled(m, data, recipes):
-    expr = sum((len(data['recipes'][recipe_key]['ingredients']) + len(data['recipes'][recipe_key]['products']) - 1) ** 1.584963 * m.r[recipe_key]/3 for recipe_key in recipes)
-    m.c.add(expr == m.buildings_scaled)
+def calculate_buildings_scaled(m, complexity_terms):
+    expr = recipe_terms_expr(m, complexity_terms)
+    m.rows['buildings_scaled'] = m.c.add(expr == m.buildings_scaled)
 
 def calculate_resources_scaled(m, resource_weights):
-    expr = sum(resource_weights[resource] * m.i[resource] for resource in resource_weights if resource in m.i)
-    m.c.add(expr == m.resources_scaled)
+    expr = resources_scaled_expr(m, resource_weights)
+    m.rows['resources_scaled'] = m.c.add(expr == m.resources_scaled)
 
-def calculate_sink_points(m, data, items):
-    expr = sum(data['items'][item]['points'] * m.x[item] for item in items if item in data['items'] and data['items'][item]['points'] > 0 and data['items'][item]['form'] == 'RF_SOLID')
-    m.c.add(expr == m.sink_points)
+def calculate_sink_points(m, point_terms):
+    expr = points_terms_expr(m, point_terms)
+    m.rows['sink_points'] = m.c.add(expr == m.sink_points)
 
 def set_objective(m, settings):
     waste_penalty_expr = m.x['Desc_NuclearWaste_C'] + \
@@ -145,31 +197,84 @@ def set_objective(m, settings):
                 waste_penalty_expr * settings['weights']['Nuclear Waste'],
             sense = minimize)
 
-def create_model(data, settings):
+def calculate_resource_weights(settings, resources):
+    filtered_limits = {key: value for key, value in settings['resource_limits'].items() if key != 'Desc_Water_C'}
+    avg_limit = sum(filtered_limits.values()) / len(filtered_limits)
+    resource_weights = {}
+    for resource in resources:
+        # Prevent divide-by-zero error, a zero limit already keeps the resource unused
+        resource_weights[resource] = avg_limit / max(settings['resource_limits'][resource], 0.00001)
+    return resource_weights
+
+def data_coefficients(data):
+    # Coefficient tables of the model from the game data dicts
+    resources, recipes, products, ingredients = extract_items(data)
+    all_items = resources.union(products, ingredients)
+    product_terms = {item: [] for item in products}
+    ingredient_terms = {item: [] for item in all_items}
+    for recipe_key, recipe_data in data['recipes'].items():
+        for field, terms in (('products', product_terms), ('ingredients', ingredient_terms)):
+            for item, rate in recipe_rates(recipe_data, field):
+                if item in terms:
+                    terms[item].append((recipe_key, rate))
+
+    return {
+        'items': all_items,
+        'recipes': recipes,
+        'resources': resources,
+        'products': product_terms,
+        'ingredients': ingredient_terms,
+        'power_use': [(recipe_key, data['recipes'][recipe_key]['power_use']) for recipe_key in recipes],
+        'complexity': [(recipe_key, recipe_complexity(data['recipes'][recipe_key])) for recipe_key in recipes],
+        'points': [(item, item_points(data, item)) for item in products]}
+
+def array_coefficients(planning):
+    # The same tables from the flat planning arrays of shared_data.py
+    items, recipes = planning['items'], planning['recipes']
+
+    def terms(rates, keep):
+        offsets, recipe_index, rate = planning[f'{rates}_offsets'], planning[f'{rates}_recipes'], planning[f'{rates}_rates']
+        return {item: [(recipes[recipe_index[j]], rate[j]) for j in range(offsets[k], offsets[k + 1])]
+                for k, item in enumerate(items) if keep[k]}
+
+    return {
+        'items': set(items),
+        'recipes': set(recipes),
+        'resources': {item for item, resource in zip(items, planning['is_resource']) if resource},
+        'products': terms('product', planning['is_product']),
+        'ingredients': terms('ingredient', [True] * len(items)),
+        'power_use': list(zip(recipes, planning['power_use'])),
+        'complexity': list(zip(recipes, planning['complexity'])),
+        'points': list(zip(items, planning['points']))}
+
+def create_model_from_coefficients(coefficients, settings):
     m = ConcreteModel()
     m.c = ConstraintList()
+    m.rows = {}  # Constraints of m.c by item or cost, so they can be rebuilt in place
 
-    resources, recipes, products, ingredients = extract_items(data)
-    define_variables(m, resources.union(products, ingredients), recipes)
-    fix_input_amounts(m, settings, resources.union(products, ingredients))
+    all_items, recipes = coefficients['items'], coefficients['recipes']
+    define_variables(m, all_items, recipes)
+    fix_input_amounts(m, settings, all_items)
     fix_output_amounts(m, settings)
-    add_product_constraints(m, products, data)
-    add_ingredient_constraints(m, resources.union(products, ingredients), data)
+    add_product_constraints(m, coefficients['products'])
+    add_ingredient_constraints(m, coefficients['ingredients'])
     add_resource_constraints(m, settings)
     
-    filtered_limits = {key: value for key, value in settings['resource_limits'].items() if key != 'Desc_Water_C'}
-    avg_limit = sum(filtered_limits.values()) / len(filtered_limits)
-    resource_weights = {}
-    for resource in resources:
-        resource_weights[resource] = avg_limit / settings['resource_limits'][resource]
+    resource_weights = calculate_resource_weights(settings, coefficients['resources'])
 
-    calculate_power_use(m, data, recipes)
-    calculate_item_use(m, resources.union(products, ingredients))
+    calculate_power_use(m, coefficients['power_use'], coefficients['resources'])
+    calculate_item_use(m, all_items)
     calculate_building_use(m, recipes)
     calculate_resource_use(m, settings)
-    calculate_buildings_scaled(m, data, recipes)
+    calculate_buildings_scaled(m, coefficients['complexity'])
     calculate_resources_scaled(m, resource_weights)
-    calculate_sink_points(m, data, products)
+    calculate_sink_points(m, coefficients['points'])
     set_objective(m, settings)
 
     return m
+
+def create_model(data, settings):
+    return create_model_from_coefficients(data_coefficients(data), settings)
+
+def create_model_from_arrays(planning, settings):
+    return create_model_from_coefficients(array_coefficients(planning), settings)
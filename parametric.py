@@ -0,0 +1,152 @@
+from main import InfeasibleError, build_model, get_solver
+from pyomo.environ import *
+
+# Relative tolerance for comparing objective values and slopes along the curve
+TOLERANCE = 1e-7
+
+def is_close(a, b):
+    return abs(a - b) <= TOLERANCE * max(1, abs(a), abs(b))
+
+def target_value(m, target):
+    if target == 'Points':
+        return m.sink_points.value
+    elif target:
+        return m.x[target].value
+    return None
+
+def solve_point(m, solver, data, direction, target, t):
+    for resource, amount in direction.items():
+        m.resource_limit[resource] = t * amount
+
+    result = solver.solve(m, load_solutions=False)
+    if result.solver.termination_condition != TerminationCondition.optimal:
+        raise InfeasibleError(f"Model is {result.solver.termination_condition} at t={t}.")
+    m.solutions.load_from(result)
+
+    # The dual of each limit is the objective change per unit of that limit,
+    # so the slope along the direction is constant while the basis does not change
+    slope = sum(m.dual[m.resource_constraints[resource]] * amount for resource, amount in direction.items())
+
+    return {
+        't': t,
+        'resource_limits': {resource: t * amount for resource, amount in direction.items()},
+        'objective': value(m.objective),
+        'slope': slope,
+        'target': target_value(m, target),
+        'recipes_used': {data['recipes'][var_name]['name']: var.value for var_name, var in m.r.items() if var.value is not None and var.value > 0.001}}
+
+def smallest_feasible_t(m, solver, direction, t_start, t_end):
+    # Lowest t in the range with a plan, from one solve that minimizes t over the same rows.
+    # Returns None when even t_end has none.
+    m.t = Var(bounds=(t_start, t_end))
+    m.t_limit = Constraint(list(direction), rule=lambda m, resource: m.i[resource] <= m.t * direction[resource])
+    for resource in direction:
+        m.resource_constraints[resource].deactivate()
+    m.objective.deactivate()
+    m.t_objective = Objective(expr=m.t, sense=minimize)
+    try:
+        result = solver.solve(m, load_solutions=False)
+        if result.solver.termination_condition != TerminationCondition.optimal:
+            return None
+        m.solutions.load_from(result)
+        return m.t.value
+    finally:
+        for name in ('t_objective', 't_limit', 't'):
+            m.del_component(name)
+        for resource in direction:
+            m.resource_constraints[resource].activate()
+        m.objective.activate()
+
+def parametric_resource_limits(data, settings, direction, t_start=0.0, t_end=1.0, target=None, max_solves=200):
+    # Limits follow limit(t) = t * direction[resource] for each resource in direction,
+    # every other limit keeps its settings value.
+    # e.g. direction={'Desc_SAM_C': 10200.0} sweeps SAM from 0 to 10200 as t goes from 0 to 1.
+    # If the model has no plan at t_start, e.g. fixed outputs that need the swept resource, the curve
+    # starts at the lowest feasible t and 'infeasible' holds the range below it.
+    for resource, amount in direction.items():
+        if resource not in settings['resource_limits']:
+            raise KeyError(f"Resource '{resource}' not found in resource limits.")
+        # Raising t then only adds plans, so the feasible part of the range is one interval up to t_end
+        if amount < 0:
+            raise ValueError(f"Direction amount for '{resource}' must not be negative.")
+    if t_start >= t_end:
+        raise ValueError("t_start must be lower than t_end.")
+    if target is None:
+        target = settings['max_item']
+    # Without max_item the Resources Scaled cost weighs each resource by avg_limit / limit. Those weights
+    # change with t, so the curve is not piecewise-linear and the tangent method below does not apply.
+    if not settings['max_item'] and settings['weights']['Resources Scaled']:
+        raise ValueError("Parametric limits need a max_item, or a Resources Scaled weight of 0, "
+                         "since the resource weights change with the limits.")
+
+    # Build once, only the limit parameters change between solves
+    m = build_model(data, settings)
+    m.dual = Suffix(direction=Suffix.IMPORT)
+    solver = get_solver()
+
+    points = {}
+    def solve_at(t):
+        if t not in points:
+            points[t] = solve_point(m, solver, data, direction, target, t)
+        return points[t]
+
+    # The optimal objective is convex and piecewise-linear in t. Intersecting the
+    # tangents at both ends of an interval either lands on the curve (a single
+    # breakpoint) or splits the interval in two.
+    infeasible = None
+    first = t_start
+    try:
+        solve_at(t_start)
+    except InfeasibleError:
+        first = smallest_feasible_t(m, solver, direction, t_start, t_end)
+        if first is None:
+            raise InfeasibleError(f"Model is infeasible for every t up to t_end={t_end}.")
+        try:
+            solve_at(first)
+        except InfeasibleError:
+            # The solve's feasibility tolerance can leave the lowest t just short
+            first = min(t_end, first + TOLERANCE * (t_end - t_start))
+            solve_at(first)
+        infeasible = {'start': t_start, 'end': first}
+
+    breakpoints = set()
+    intervals = [(solve_at(first), solve_at(t_end))] if first < t_end else []
+    while intervals and len(points) < max_solves:
+        a, b = intervals.pop()
+        if is_close(a['slope'], b['slope']):
+            continue
+        t = (b['objective'] - a['objective'] + a['slope'] * a['t'] - b['slope'] * b['t']) / (a['slope'] - b['slope'])
+        t = min(max(t, a['t']), b['t'])
+        # Snap to an end so rounding does not leave a zero-length segment
+        if abs(t - a['t']) <= TOLERANCE * (t_end - t_start):
+            t = a['t']
+        elif abs(b['t'] - t) <= TOLERANCE * (t_end - t_start):
+            t = b['t']
+        c = solve_at(t)
+        if t in (a['t'], b['t']) or is_close(c['objective'], a['objective'] + a['slope'] * (t - a['t'])):
+            breakpoints.add(t)
+        else:
+            intervals += [(a, c), (c, b)]
+
+    # Intervals left over mean max_solves ran out before every breakpoint was found
+    complete = not intervals
+
+    # Each segment has one recipe mix, solve at its midpoint to read it
+    knots = [first] + sorted(t for t in breakpoints if first < t < t_end) + [t_end] if first < t_end else [t_end]
+    segments = []
+    for start, end in zip(knots, knots[1:]):
+        a, b = solve_at(start), solve_at(end)
+        mid = solve_at((start + end) / 2)
+        segments.append({
+            'start': start,
+            'end': end,
+            'slope': (b['objective'] - a['objective']) / (end - start),
+            'target_slope': (b['target'] - a['target']) / (end - start) if target else None,
+            'recipes_used': mid['recipes_used']})
+
+    return {
+        'breakpoints': [{key: points[t][key] for key in ('t', 'resource_limits', 'objective', 'target')} for t in knots],
+        'segments': segments,
+        'solves': len(points),
+        'complete': complete,
+        'infeasible': infeasible}
@@ -0,0 +1,190 @@
+from array import array
+import json
+import sqlite3
+import zlib
+
+# Position of the row kept for an empty list, so the key still loads as []
+EMPTY_LIST = -1
+# Scalar results kept for every scenario, one compressed column each
+SUMMARY_KEYS = ['sink_points', 'power_produced', 'power_use', 'item_use', 'buildings', 'resources', 'buildings_scaled', 'resources_scaled']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    scenarios BLOB NOT NULL,
+    summary BLOB NOT NULL,
+    recipe_offsets BLOB NOT NULL,
+    recipe_names BLOB NOT NULL,
+    recipe_values BLOB NOT NULL,
+    item_offsets BLOB NOT NULL,
+    item_names BLOB NOT NULL,
+    item_values BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS scenarios (id INTEGER PRIMARY KEY, chunk INTEGER NOT NULL, position INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS params (scenario INTEGER NOT NULL, key TEXT NOT NULL, position INTEGER, value TEXT NOT NULL, number REAL);
+CREATE TABLE IF NOT EXISTS uses (name INTEGER NOT NULL, scenario INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS params_index ON params (key, value, scenario);
+CREATE INDEX IF NOT EXISTS params_number_index ON params (key, number, scenario);
+CREATE INDEX IF NOT EXISTS uses_index ON uses (name, scenario);
+"""
+
+def connect(path):
+    # WAL lets readers run while a worker appends, the timeout makes writers queue up
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+def pack(values, typecode):
+    return zlib.compress(array(typecode, values).tobytes())
+
+def unpack(blob, typecode):
+    values = array(typecode)
+    values.frombytes(zlib.decompress(blob))
+    return values
+
+def settings_params(settings):
+    # Flatten settings into scalar parameters, lists become repeated keys
+    params = {
+        'max_item': settings['max_item'],
+        'checkbox_Nuclear Waste': settings['checkbox_Nuclear Waste'],
+        'recipes_off': list(settings['recipes_off'])}
+    params.update({f"limit.{key}": value for key, value in settings['resource_limits'].items()})
+    params.update({f"weight.{key}": value for key, value in settings['weights'].items()})
+    params.update({f"input.{key}": value for key, value in settings['inputs'].items()})
+    if settings['outputs'] != []:
+        params.update({f"output.{key}": value for key, value in settings['outputs'].items()})
+    return params
+
+def param_rows(scenario, params):
+    # List elements keep their position, scalars have none
+    for key, values in params.items():
+        if values == []:
+            yield (scenario, key, EMPTY_LIST, json.dumps([]), None)
+            continue
+        elements = enumerate(values) if isinstance(values, list) else [(None, values)]
+        for position, value in elements:
+            number = value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+            yield (scenario, key, position, json.dumps(value), number)
+
+def name_ids(conn, names):
+    conn.executemany('INSERT OR IGNORE INTO names (name) VALUES (?)', [(name,) for name in names])
+    ids = {}
+    for name in names:
+        ids[name] = conn.execute('SELECT id FROM names WHERE name = ?', (name,)).fetchone()[0]
+    return ids
+
+def append_results(path, scenarios):
+    # scenarios is a list of (params, results) pairs, results as returned by optimize_production.
+    # All of them are written as one chunk in a single transaction, so workers can append in parallel.
+    if not scenarios:
+        return []
+    conn = connect(path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        names = {f"recipe:{key}" for _, results in scenarios for key in results['recipe_amounts']}
+        names |= {f"item:{key}" for _, results in scenarios for key in results['item_amounts']}
+        ids = name_ids(conn, sorted(names))
+
+        first = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM scenarios').fetchone()[0]
+        scenario_ids = list(range(first, first + len(scenarios)))
+
+        columns = {'recipe': ([0], [], []), 'item': ([0], [], [])}
+        for _, results in scenarios:
+            for kind, amounts in (('recipe', results['recipe_amounts']), ('item', results['item_amounts'])):
+                offsets, name_list, values = columns[kind]
+                name_list += [ids[f"{kind}:{key}"] for key in amounts]
+                values += list(amounts.values())
+                offsets.append(len(values))
+        summary = [results[key] for key in SUMMARY_KEYS for _, results in scenarios]
+
+        chunk = conn.execute(
+            'INSERT INTO chunks (size, scenarios, summary, recipe_offsets, recipe_names, recipe_values, item_offsets, item_names, item_values) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (len(scenarios), pack(scenario_ids, 'q'), pack(summary, 'd'),
+             pack(columns['recipe'][0], 'q'), pack(columns['recipe'][1], 'q'), pack(columns['recipe'][2], 'd'),
+             pack(columns['item'][0], 'q'), pack(columns['item'][1], 'q'), pack(columns['item'][2], 'd'))).lastrowid
+
+        conn.executemany('INSERT INTO scenarios (id, chunk, position) VALUES (?, ?, ?)',
+                         [(scenario, chunk, position) for position, scenario in enumerate(scenario_ids)])
+        conn.executemany('INSERT INTO params (scenario, key, position, value, number) VALUES (?, ?, ?, ?, ?)',
+                         [row for scenario, (params, _) in zip(scenario_ids, scenarios) for row in param_rows(scenario, params)])
+        conn.executemany('INSERT INTO uses (name, scenario) VALUES (?, ?)',
+                         [(ids[f"{kind}:{key}"], scenario)
+                          for scenario, (_, results) in zip(scenario_ids, scenarios)
+                          for kind, amounts in (('recipe', results['recipe_amounts']), ('item', results['item_amounts']))
+                          for key in amounts])
+        conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return scenario_ids
+
+def query_scenarios(path, recipe=None, item=None, params=None):
+    # Scenario ids using the recipe and the item, with params given as {key: value} or {key: (low, high)}.
+    # Only the indexes are read, no chunk is decompressed.
+    filters, args = [], []
+    for kind, key in (('recipe', recipe), ('item', item)):
+        if key is not None:
+            filters.append('id IN (SELECT scenario FROM uses WHERE name = (SELECT id FROM names WHERE name = ?))')
+            args.append(f"{kind}:{key}")
+    for key, value in (params or {}).items():
+        if isinstance(value, tuple):
+            filters.append('id IN (SELECT scenario FROM params WHERE key = ? AND number BETWEEN ? AND ?)')
+            args += [key, value[0], value[1]]
+        else:
+            filters.append('id IN (SELECT scenario FROM params WHERE key = ? AND value = ?)')
+            args += [key, json.dumps(value)]
+
+    conn = connect(path)
+    try:
+        where = ' WHERE ' + ' AND '.join(filters) if filters else ''
+        return [row[0] for row in conn.execute(f'SELECT id FROM scenarios{where} ORDER BY id', args)]
+    finally:
+        conn.close()
+
+def load_scenario_params(conn, scenario):
+    params = {}
+    for key, position, value in conn.execute('SELECT key, position, value FROM params WHERE scenario = ? ORDER BY key, position', (scenario,)):
+        if position is None:
+            params[key] = json.loads(value)
+        elif position == EMPTY_LIST:
+            params[key] = []
+        else:
+            params.setdefault(key, []).append(json.loads(value))
+    return params
+
+def load_results(path, scenario_ids):
+    # Decompress each needed chunk once and return {id: {'params', 'recipe_amounts', 'item_amounts', summaries}}
+    conn = connect(path)
+    try:
+        names = {name_id: name.split(':', 1)[1] for name_id, name in conn.execute('SELECT id, name FROM names')}
+        located = {}
+        for scenario in scenario_ids:
+            row = conn.execute('SELECT chunk, position FROM scenarios WHERE id = ?', (scenario,)).fetchone()
+            if row is None:
+                raise KeyError(f"Scenario '{scenario}' not found in results store.")
+            located.setdefault(row[0], []).append((scenario, row[1]))
+
+        loaded = {}
+        for chunk, members in located.items():
+            size, *blobs = conn.execute(
+                'SELECT size, summary, recipe_offsets, recipe_names, recipe_values, item_offsets, item_names, item_values FROM chunks WHERE id = ?',
+                (chunk,)).fetchone()
+            summary = unpack(blobs[0], 'd')
+            columns = {
+                'recipe_amounts': (unpack(blobs[1], 'q'), unpack(blobs[2], 'q'), unpack(blobs[3], 'd')),
+                'item_amounts': (unpack(blobs[4], 'q'), unpack(blobs[5], 'q'), unpack(blobs[6], 'd'))}
+            for scenario, position in members:
+                results = {key: summary[k * size + position] for k, key in enumerate(SUMMARY_KEYS)}
+                for field, (offsets, name_list, values) in columns.items():
+                    start, end = offsets[position], offsets[position + 1]
+                    results[field] = {names[name_list[j]]: values[j] for j in range(start, end)}
+                results['params'] = load_scenario_params(conn, scenario)
+                loaded[scenario] = results
+        return loaded
+    finally:
+        conn.close()
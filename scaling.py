@@ -0,0 +1,106 @@
+from pyomo.environ import *
+from pyomo.repn import generate_standard_repn
+import math
+
+# Experimental, off by default. Benchmarks/benchmark_scaling.py measured it slower overall: 0.98 s
+# scaled against 0.73 s plain in total, with 493 against 578 iterations, HiGHS standing in for GLPK.
+# Computing the factors costs more than the iterations save. glpsol also scales every model by
+# default, and no GLPK numbers exist yet.
+
+# Number of alternating row/column geometric-mean passes
+PASSES = 4
+
+def power_of_two(x):
+    # Round factors to powers of two so scaling adds no rounding error
+    return 2.0 ** round(math.log2(x))
+
+def geometric_factor(values):
+    return 1 / math.sqrt(max(values) * min(values))
+
+def linear_terms(repn):
+    return [(var, coef) for var, coef in zip(repn.linear_vars, repn.linear_coefs) if coef != 0]
+
+def compute_scaling_factors(m):
+    # Row, column and objective factors as powers of two. A row is multiplied by its factor, a column
+    # is divided by its factor. Nonzero coefficients of every active constraint, fixed variables count
+    # as constants.
+    rows = {}
+    for con in m.component_data_objects(Constraint, active=True):
+        repn = generate_standard_repn(con.body, compute_values=True)
+        if linear_terms(repn):
+            rows[con] = repn
+
+    columns = ComponentMap()
+    for con, repn in rows.items():
+        for var, coef in linear_terms(repn):
+            columns.setdefault(var, []).append((con, abs(coef)))
+
+    # Alternate row and column passes so |a_ij| * row_i * col_j moves towards 1
+    row_scale = {con: 1.0 for con in rows}
+    col_scale = ComponentMap((var, 1.0) for var in columns)
+    for _ in range(PASSES):
+        for con, repn in rows.items():
+            row_scale[con] = geometric_factor([abs(coef) * col_scale[var] for var, coef in linear_terms(repn)])
+        for var, coefs in columns.items():
+            col_scale[var] = geometric_factor([coef * row_scale[con] for con, coef in coefs])
+
+    # Center the scaled costs around 1, normalizing by the largest one would push
+    # small weights such as Power Use below the solver's optimality tolerance
+    objective = next(m.component_data_objects(Objective, active=True))
+    objective_repn = generate_standard_repn(objective.expr, compute_values=True)
+    costs = [abs(coef) * col_scale[var] for var, coef in linear_terms(objective_repn) if var in col_scale]
+    objective_factor = power_of_two(geometric_factor(costs)) if costs else 1.0
+
+    return {
+        'rows': {con: (power_of_two(row_scale[con]), repn) for con, repn in rows.items()},
+        'columns': ComponentMap((var, power_of_two(1 / factor)) for var, factor in col_scale.items()),
+        'objective': (objective, objective_factor, objective_repn)}
+
+def scaled_expr(repn, columns, factor):
+    return factor * (repn.constant + sum(coef / columns.get(var, 1.0) * var for var, coef in linear_terms(repn)))
+
+def scale_model(m):
+    # Scale m in place, its variables then hold the scaled values. Rewriting the rows avoids copying
+    # the model for every solve. Returns what unscale_solution needs to undo it.
+    scaling = compute_scaling_factors(m)
+    columns = scaling['columns']
+    scaling['exprs'] = {con: con.expr for con in scaling['rows']}
+    for con, (factor, repn) in scaling['rows'].items():
+        lower, upper = value(con.lower), value(con.upper)
+        body = scaled_expr(repn, columns, factor)
+        if con.equality:
+            con.set_value(body == upper * factor)
+        else:
+            con.set_value((None if lower is None else lower * factor, body, None if upper is None else upper * factor))
+
+    objective, factor, repn = scaling['objective']
+    scaling['objective_expr'] = objective.expr
+    objective.set_value(scaled_expr(repn, columns, factor))
+
+    # Every variable is only bounded below by zero, which scaling keeps, so only values change
+    for var, factor in columns.items():
+        if var.value is not None:
+            var.set_value(var.value * factor, skip_validation=True)
+    return scaling
+
+def unscale_solution(m, scaling):
+    # Restore the rows and objective of m and move its solution, duals and reduced costs back to the
+    # original units, as core.scale_model's propagate_solution does
+    for con, expr in scaling['exprs'].items():
+        con.set_value(expr)
+    objective, objective_factor, _ = scaling['objective']
+    objective.set_value(scaling['objective_expr'])
+
+    for var, factor in scaling['columns'].items():
+        if var.value is not None:
+            var.set_value(var.value / factor, skip_validation=True)
+
+    dual, rc = m.component('dual'), m.component('rc')
+    if isinstance(dual, Suffix):
+        for con, (factor, _) in scaling['rows'].items():
+            if con in dual:
+                dual[con] = dual[con] * factor / objective_factor
+    if isinstance(rc, Suffix):
+        for var, factor in scaling['columns'].items():
+            if var in rc:
+                rc[var] = rc[var] * factor / objective_factor
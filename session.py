@@ -0,0 +1,103 @@
+import copy
+
+from data_patch import diff_data, is_empty, patch_model
+from main import build_model, collect_results, get_solver, settings_key, solve_model
+from model import recipe_complexity, recipe_rates
+from whatif import what_if
+from pyomo.environ import *
+
+# Reduced costs above this keep a cached result optimal
+TOLERANCE = 1e-7
+
+class PlannerSession:
+    # Keeps one model and the last result per settings, game data patches are applied in place
+
+    def __init__(self, data):
+        self.data = data
+        self.models = {}
+        self.results = {}
+
+    def model(self, settings):
+        key = settings_key(settings)
+        if key not in self.models:
+            settings = copy.deepcopy(settings)
+            m = build_model(self.data, settings)
+            m.dual = Suffix(direction=Suffix.IMPORT)
+            self.models[key] = (settings, m)
+        return self.models[key][1]
+
+    def optimize(self, settings):
+        key = settings_key(settings)
+        if key not in self.results:
+            m = self.model(settings)
+            solve_model(m, get_solver())
+            self.results[key] = collect_results(m, self.data, self.models[key][0])
+        return self.results[key]
+
+    def what_if(self, settings, deltas):
+        # Diffs of each settings delta against the cached plan for settings, see whatif.what_if
+        base = self.optimize(settings)
+        key = settings_key(settings)
+        base_settings, m = self.models[key]
+        return what_if(m, self.data, base_settings, base, deltas)
+
+    def apply_patch(self, new_data):
+        # Patch every model in place and drop only the results the patch can change
+        patch = diff_data(self.data, new_data)
+        if is_empty(patch):
+            return patch
+        invalid = {key for key, results in self.results.items() if depends_on_patch(self.data, self.models[key], results, patch)}
+
+        self.data = new_data
+        for settings, m in self.models.values():
+            patch_model(m, new_data, patch, settings)
+
+        for key in invalid:
+            del self.results[key]
+        # Names in cached results come from the old data
+        for key, (settings, m) in self.models.items():
+            if key in self.results:
+                self.results[key] = collect_results(m, new_data, settings)
+        return patch
+
+def depends_on_patch(data, model, results, patch):
+    settings, m = model
+    recipes = patch['recipes']
+    items = patch['items']
+
+    # The cached plan uses something the patch changes or removes
+    used_recipes = set(results['recipe_amounts'])
+    used_items = set(results['item_amounts'])
+    if used_recipes & (set(recipes['removed']) | set(recipes['changed'])):
+        return True
+    if used_items & (set(items['removed']) | set(items['changed']) | set(patch['resources']['changed'])):
+        return True
+    if settings['max_item'] == 'Points' and (items['added'] or items['removed'] or items['changed']):
+        return True
+
+    # The plan stays feasible, it stays optimal while no added or changed recipe has a negative
+    # reduced cost against the duals of the last solve. Rows the model does not have yet have no dual.
+    for recipe in set(recipes['added']) | set(recipes['changed']):
+        if recipe in settings['recipes_off']:
+            continue
+        recipe_data = recipes['added'][recipe] if recipe in recipes['added'] else recipes['changed'][recipe]['new']
+        if reduced_cost(m, recipe, recipe_data, data['resources']) < -TOLERANCE:
+            return True
+    return False
+
+def reduced_cost(m, recipe, recipe_data, resources):
+    # Coefficients of the recipe column in each row body, taken from the new recipe data
+    column = [(('product', item), rate) for item, rate in recipe_rates(recipe_data, 'products') if item not in resources]
+    column += [(('ingredient', item), rate) for item, rate in recipe_rates(recipe_data, 'ingredients')]
+    column += [
+        ('power_use', recipe_data['power_use']),
+        ('building_use', 1),
+        ('buildings_scaled', recipe_complexity(recipe_data))]
+
+    # The objective only holds cost variables, so the recipe's own cost is zero
+    cost = 0.0
+    for key, coef in column:
+        if key not in m.rows or m.rows[key] not in m.dual:
+            return float('-inf')
+        cost -= m.dual[m.rows[key]] * coef
+    return cost
@@ -0,0 +1,141 @@
+from array import array
+from multiprocessing import shared_memory
+import atexit
+import json
+import struct
+
+from main import collect_plan, get_solver, solve_model
+from model import create_model_from_arrays, extract_items, item_points, recipe_complexity, recipe_rates
+
+# Typecode of every array section, strings are stored as utf-8 with offsets
+SECTIONS = {
+    'is_resource': 'b',
+    'is_product': 'b',
+    'points': 'd',
+    'power_use': 'd',
+    'complexity': 'd',
+    'product_offsets': 'q',
+    'product_recipes': 'q',
+    'product_rates': 'd',
+    'ingredient_offsets': 'q',
+    'ingredient_recipes': 'q',
+    'ingredient_rates': 'd'}
+STRINGS = ['items', 'recipes']
+
+# Attachments made by this process, kept open for its lifetime
+attached = {}
+
+def rate_columns(data, items, recipe_index, field):
+    # Per item, the recipes using it and their rate per minute, in compressed column form
+    rates = {item: [] for item in items}
+    for recipe_key, recipe_data in data['recipes'].items():
+        for item, rate in recipe_rates(recipe_data, field):
+            if item in rates:
+                rates[item].append((recipe_index[recipe_key], rate))
+    offsets, recipes, values = [0], [], []
+    for item in items:
+        recipes += [j for j, _ in rates[item]]
+        values += [rate for _, rate in rates[item]]
+        offsets.append(len(values))
+    return offsets, recipes, values
+
+def build_planning_arrays(data):
+    resources, recipes, products, ingredients = extract_items(data)
+    items = sorted(resources.union(products, ingredients))
+    recipes = sorted(recipes)
+    recipe_index = {recipe_key: j for j, recipe_key in enumerate(recipes)}
+
+    planning = {
+        'items': items,
+        'recipes': recipes,
+        'is_resource': [item in resources for item in items],
+        'is_product': [item in products for item in items],
+        'points': [item_points(data, item) if item in products else 0 for item in items],
+        'power_use': [data['recipes'][recipe_key]['power_use'] for recipe_key in recipes],
+        'complexity': [recipe_complexity(data['recipes'][recipe_key]) for recipe_key in recipes]}
+    for field, name in (('products', 'product'), ('ingredients', 'ingredient')):
+        planning[f'{name}_offsets'], planning[f'{name}_recipes'], planning[f'{name}_rates'] = rate_columns(data, items, recipe_index, field)
+    return planning
+
+def publish_planning_data(data):
+    # Copy the planning arrays into one shared memory block. Keep the returned block
+    # alive while workers run and call close() and unlink() on it when done.
+    planning = build_planning_arrays(data)
+    blobs = {}
+    for key in STRINGS:
+        encoded = [name.encode('utf-8') for name in planning[key]]
+        offsets = [0]
+        for name in encoded:
+            offsets.append(offsets[-1] + len(name))
+        blobs[f'{key}_offsets'] = ('q', array('q', offsets).tobytes())
+        blobs[f'{key}_names'] = ('B', b''.join(encoded))
+    for key, typecode in SECTIONS.items():
+        blobs[key] = (typecode, array(typecode, planning[key]).tobytes())
+
+    # Header of section offsets, each section starts on an 8-byte boundary
+    layout, position = {}, 0
+    for key, (typecode, blob) in blobs.items():
+        layout[key] = (typecode, position, len(blob))
+        position += (len(blob) + 7) // 8 * 8
+    header = json.dumps(layout).encode('utf-8')
+    start = (8 + len(header) + 7) // 8 * 8
+
+    shm = shared_memory.SharedMemory(create=True, size=start + max(position, 1))
+    shm.buf[:8] = struct.pack('q', len(header))
+    shm.buf[8:8 + len(header)] = header
+    for key, (typecode, offset, length) in layout.items():
+        shm.buf[start + offset:start + offset + length] = blobs[key][1]
+    return shm
+
+def attach_planning_data(name):
+    # Read-only views over the shared block, only the short id strings are decoded
+    if name in attached:
+        return attached[name][2]
+    # Workers should be children of the publishing process so they share its resource
+    # tracker, an unrelated process would unlink the block when it exits
+    shm = shared_memory.SharedMemory(name=name)
+
+    length = struct.unpack('q', shm.buf[:8])[0]
+    layout = json.loads(bytes(shm.buf[8:8 + length]).decode('utf-8'))
+    start = (8 + length + 7) // 8 * 8
+    views = {key: shm.buf[start + offset:start + offset + size].toreadonly().cast(typecode)
+             for key, (typecode, offset, size) in layout.items()}
+
+    planning = {key: views[key] for key in SECTIONS}
+    for key in STRINGS:
+        offsets, names = views[f'{key}_offsets'], views[f'{key}_names']
+        planning[key] = [str(names[offsets[k]:offsets[k + 1]], 'utf-8') for k in range(len(offsets) - 1)]
+
+    attached[name] = (shm, list(views.values()), planning)
+    return planning
+
+@atexit.register
+def detach_planning_data():
+    # Release the views first, a block cannot be closed while they exist
+    for shm, views, _ in attached.values():
+        for view in views:
+            view.release()
+        shm.close()
+    attached.clear()
+
+def build_shared_model(name, settings):
+    planning = attach_planning_data(name)
+
+    # Remove max_item from outputs if exists
+    if settings['max_item'] in settings['outputs']:
+        del settings['outputs'][settings['max_item']]
+
+    m = create_model_from_arrays(planning, settings)
+
+    # Turn off recipes given
+    for recipe in settings['recipes_off']:
+        m.r[recipe].fix(0)
+
+    return m
+
+def optimize_shared(name, settings, scaling=False):
+    # Worker entry point, returns costs and the solution keyed by id. main.name_results turns them
+    # into optimize_production results where data.json is loaded.
+    m = build_shared_model(name, settings)
+    solve_model(m, get_solver(), scaling)
+    return collect_plan(m, settings)
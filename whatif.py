@@ -0,0 +1,150 @@
+import copy
+
+from data_patch import set_row
+from main import InfeasibleError, build_model, collect_sparse_results, get_solver, solve_model
+from model import calculate_resource_weights, resources_scaled_expr, set_objective
+from pyomo.environ import *
+
+# Costs reported by collect_sparse_results, compared between the base plan and a what-if plan
+COSTS = ['sink_points', 'power_produced', 'power_use', 'item_use', 'buildings', 'resources', 'buildings_scaled', 'resources_scaled']
+# Amounts that differ by less than this are unchanged, as in collect_results
+THRESHOLD = 0.001
+
+def apply_delta(settings, delta):
+    # New settings from a delta: resource_limits, weights, inputs and outputs update per key (None removes
+    # an input or output), recipes_on and recipes_off turn recipes on and off, other keys replace the value
+    new = copy.deepcopy(settings)
+    for key, change in delta.items():
+        if key in ('resource_limits', 'weights'):
+            new[key].update(change)
+        elif key in ('inputs', 'outputs'):
+            amounts = dict(new[key] or {})
+            for item, amount in change.items():
+                if amount is None:
+                    amounts.pop(item, None)
+                else:
+                    amounts[item] = amount
+            new[key] = amounts
+        elif key == 'recipes_on':
+            new['recipes_off'] = [recipe for recipe in new['recipes_off'] if recipe not in change]
+        elif key == 'recipes_off':
+            new['recipes_off'] = new['recipes_off'] + [recipe for recipe in change if recipe not in new['recipes_off']]
+        else:
+            new[key] = change
+
+    # Remove max_item from outputs if exists, as build_model does
+    if new['max_item'] in (new['outputs'] or {}):
+        del new['outputs'][new['max_item']]
+    return new
+
+def check_settings(m, settings):
+    # Every id in the settings must be in the model, checked before any of them is applied
+    for resource in settings['resource_limits']:
+        if resource not in m.resource_limit:
+            raise KeyError(f"Resource '{resource}' not found in resource limits.")
+    for item in settings['inputs'] or {}:
+        if item not in m.n:
+            raise KeyError(f"Input item '{item}' not found in model items.")
+    for item in settings['outputs'] or {}:
+        if item not in m.x:
+            raise KeyError(f"Output item '{item}' not found in model items.")
+    for recipe in settings['recipes_off']:
+        if recipe not in m.r:
+            raise KeyError(f"Recipe '{recipe}' not found in model recipes.")
+    if settings['max_item'] and settings['max_item'] != 'Points' and settings['max_item'] not in m.x:
+        raise KeyError(f"Max item '{settings['max_item']}' not found in model items.")
+
+def can_update(old, new):
+    # A new max_item changes which items are fixed, the model then has to be built for the new settings
+    return old['max_item'] == new['max_item'] and old['resource_limits'].keys() == new['resource_limits'].keys()
+
+def update_model(m, data, old, new):
+    # Move a model built for the old settings to the new settings in place. Every change sets the new value
+    # outright, so calling it with old and new swapped also undoes a partly applied update.
+    if old['resource_limits'] != new['resource_limits']:
+        for resource, limit in new['resource_limits'].items():
+            m.resource_limit[resource] = limit
+        # Resource weights are relative to the limits
+        resource_weights = calculate_resource_weights(new, data['resources'])
+        set_row(m, 'resources_scaled', resources_scaled_expr(m, resource_weights) == m.resources_scaled)
+
+    old_inputs, new_inputs = old['inputs'] or {}, new['inputs'] or {}
+    for item in old_inputs.keys() | new_inputs.keys():
+        if old_inputs.get(item) != new_inputs.get(item):
+            m.n[item].fix(new_inputs.get(item, 0))
+
+    old_outputs, new_outputs = old['outputs'] or {}, new['outputs'] or {}
+    for item in old_outputs.keys() | new_outputs.keys():
+        if item in new_outputs:
+            m.x[item].fix(new_outputs[item])
+        elif item in old_outputs:
+            m.x[item].unfix()
+
+    old_off, new_off = set(old['recipes_off']), set(new['recipes_off'])
+    for recipe in old_off - new_off:
+        m.r[recipe].unfix()
+    for recipe in new_off - old_off:
+        m.r[recipe].fix(0)
+
+    if old['weights'] != new['weights'] or old['checkbox_Nuclear Waste'] != new['checkbox_Nuclear Waste']:
+        if m.component('objective') is not None:
+            m.del_component(m.objective)
+        set_objective(m, new)
+
+def diff_amounts(base, new, names):
+    # Only ids in either support can differ, every other amount is zero in both plans
+    changes = {}
+    for key in base.keys() | new.keys():
+        delta = new.get(key, 0) - base.get(key, 0)
+        if abs(delta) > THRESHOLD:
+            changes[key] = {'name': names[key]['name'], 'base': base.get(key, 0), 'new': new.get(key, 0), 'delta': delta}
+    return changes
+
+def diff_plans(data, base, new):
+    # Changed recipes and items between two collect_sparse_results plans, with the change of every cost
+    return {
+        'recipes': diff_amounts(base['recipe_amounts'], new['recipe_amounts'], data['recipes']),
+        'items': diff_amounts(base['item_amounts'], new['item_amounts'], {**data['items'], **data['resources']}),
+        'costs': {cost: new[cost] - base[cost] for cost in COSTS}}
+
+def what_if(m, data, settings, base, deltas):
+    # Re-solve the base model m, built for settings and holding the base plan, once per delta. Each delta
+    # is applied in place and undone afterwards, so only the changed bounds, fixes and rows are rewritten.
+    # Returns one diff_plans result per delta, with 'feasible' False and the error if it has no solution.
+    solver = get_solver()
+
+    # Keep the base solution and duals, PlannerSession reads them after a game data patch
+    values = [(var, var.value) for var in m.component_data_objects(Var)]
+    duals = list(m.dual.items()) if hasattr(m, 'dual') else []
+
+    # Check every delta first so a bad one fails before the model changes
+    all_settings = [apply_delta(settings, delta) for delta in deltas]
+    for new_settings in all_settings:
+        check_settings(m, new_settings)
+
+    diffs = []
+    try:
+        for new_settings in all_settings:
+            try:
+                if can_update(settings, new_settings):
+                    try:
+                        update_model(m, data, settings, new_settings)
+                        solve_model(m, solver)
+                        plan = collect_sparse_results(m)
+                    finally:
+                        update_model(m, data, new_settings, settings)
+                else:
+                    new_m = build_model(data, new_settings)
+                    solve_model(new_m, solver)
+                    plan = collect_sparse_results(new_m)
+            except InfeasibleError as e:
+                diffs.append({'feasible': False, 'error': str(e), 'settings': new_settings})
+                continue
+            diffs.append({'feasible': True, 'settings': new_settings, **diff_plans(data, base, plan)})
+    finally:
+        for var, saved in values:
+            var.set_value(saved, skip_validation=True)
+        if duals:
+            m.dual.clear()
+            m.dual.update(duals)
+    return diffs